@@ -56,7 +56,7 @@ def test_adder(n, add, interleaved=True):
 
 def make_alu_inputs(n, interleaved):
     c_in = dd.Variable(-1)
-    inputs = map(dd.Variable, range(2*n))
+    inputs = list(map(dd.Variable, range(2*n)))
     if interleaved:
         A = inputs[0::2]
         B = inputs[1::2]
@@ -1,5 +1,5 @@
 # Auto-extracted from the Code Words article
-from utils import memoize
+from utils import memoize, memoize_safely, stepwise, build_iteratively, limit_caches, LossyCache
 
 class Node(object):
     "A binary-decision-diagram node."
@@ -7,16 +7,18 @@ class Node(object):
     __and__    = lambda self, other: self(const0, other)
     __or__     = lambda self, other: self(other, const1)
     __xor__    = lambda self, other: self(other, ~other)
+    level      = property(lambda self: self.rank)   # (As in dd.py.)
 
 def Equiv(p, q):   return p(~q, q)
 def Implies(p, q): return p(const1, q)
 class ConstantNode(Node):
     rank = float('Inf')   # (Greater than any variable's rank.)
+    branches = ()
     def __init__(self, value):     self.value = value
     def evaluate(self, env):       return self.value
     def __call__(self, *branches): return branches[self.value]
 
-Constant = memoize(ConstantNode)
+Constant = memoize_safely(ConstantNode)
 const0, const1 = Constant(0), Constant(1)
 
 def Variable(rank):
@@ -29,39 +31,124 @@ class ChoiceNode(Node):
         self.rank = rank
         self.if0 = if0
         self.if1 = if1
+    branches = property(lambda self: (self.if0, self.if1))
     def evaluate(self, env):
-        branch = (self.if0, self.if1)[env[self.rank]]
-        return branch.evaluate(env)
+        node = self
+        while node.value is None:
+            node = (node.if0, node.if1)[env[node.rank]]
+        return node.value
     def __call__(self, if0, if1):
         if if0 is if1: return if0
         if (if0, if1) == (const0, const1):
             return self
         # The above cases usually save work, but aren't needed for correctness.
-        return build_choice(self, if0, if1)
+        return run(build_choice, (self, if0, if1))
 
-build_node = memoize(ChoiceNode)
-@memoize
-def build_choice(node, if0, if1):
+build_node = memoize_safely(ChoiceNode)
+
+# build_choice and the rest are stepwise functions (see utils), so as to
+# build without recursion: each key function returns the result instead
+# when there's nothing to build.
+
+iterative = True  # Build with explicit stacks, so deep diagrams can't overflow Python's.
+
+def run(f, case):
+    "Return case if it's a node, else f(*case) for f made by stepwise."
+    if not isinstance(case, tuple): return case
+    if iterative: return build_iteratively(f, case)
+    return f(*case)
+
+def choice_key(node, if0, if1):
+    "Return node(if0, if1) if it needs no building, else the key to build it."
+    if node.value is not None: return (if0, if1)[node.value]
+    if if0 is if1: return if0
+    if (if0, if1) == (const0, const1): return node
+    return (node, if0, if1)
+
+def choice_cases(key, done):
     """Like Choice(node, if0, if1) in logic.py, but McCarthy-standardized,
     presupposing the arguments are all McCarthy-standardized."""
-    top = min(node.rank, if0.rank, if1.rank)
-    cases = [subst(node, top, value)(subst(if0, top, value),
-                                     subst(if1, top, value))
-             for value in (0, 1)]
-    return make_node(top, *cases)
+    top = min(e.rank for e in key)
+    for value in (0, 1):
+        yield choice_key(*[cofactor(e, top, value) for e in key])
+
+def choice_join(key, done):
+    return make_node(min(e.rank for e in key), *done)
+
+build_choice = stepwise(choice_cases, choice_join)
 
 def make_node(rank, if0, if1):
     if if0 is if1: return if0
     return build_node(rank, if0, if1)
 
+def cofactor(node, rank, value):
+    """Like subst, but only for a rank no greater than node's, so it
+    needn't recur: this is all that build_choice needs."""
+    if rank < node.rank: return node
+    return (node.if0, node.if1)[value]
+
 def subst(node, rank, value):
     """Specialize node to the case where variable #rank takes the given value.
     Again, node must be standardized."""
+    return run(build_subst, subst_key(node, rank, value))
+
+def subst_key(node, rank, value):
     if   rank <  node.rank: return node
     elif rank == node.rank: return (node.if0, node.if1)[value]
-    else:                   return make_node(node.rank,
-                                             subst(node.if0, rank, value),
-                                             subst(node.if1, rank, value))
+    else:                   return (node, rank, value)
+
+def subst_cases(key, done):
+    node, rank, value = key
+    yield subst_key(node.if0, rank, value)
+    yield subst_key(node.if1, rank, value)
+
+build_subst = stepwise(subst_cases, lambda key, done: make_node(key[0].rank, *done))
+def constrain(node, care):
+    """Return a node agreeing with node wherever care is 1, and elsewhere
+    as small as Coudert and Madre's generalized cofactor makes it."""
+    return generalized_cofactor(node, care, False)
+
+def restrict(node, care):
+    "Like constrain, but never bringing in a variable node doesn't test."
+    return generalized_cofactor(node, care, True)
+
+def generalized_cofactor(node, care, restricting):
+    return run(build_generalized_cofactor,
+               generalized_cofactor_key(node, care, restricting))
+
+def generalized_cofactor_key(node, care, restricting):
+    if care.value is not None or node.value is not None: return node
+    if node is care: return const1
+    return (node, care, restricting)
+
+def generalized_cofactor_cases(key, done):
+    node, care, restricting = key
+    if restricting and care.rank < node.rank:
+        yield generalized_cofactor_key(node, care.if0 | care.if1, True)
+        return
+    top = min(node.rank, care.rank)
+    (f0, f1), (c0, c1) = [(cofactor(e, top, 0), cofactor(e, top, 1))
+                          for e in (node, care)]
+    if c0 is not const0: yield generalized_cofactor_key(f0, c0, restricting)
+    if c1 is not const0: yield generalized_cofactor_key(f1, c1, restricting)
+
+def generalized_cofactor_join(key, done):
+    if len(done) == 1: return done[0]
+    return make_node(min(key[0].rank, key[1].rank), *done)
+
+build_generalized_cofactor = stepwise(generalized_cofactor_cases,
+                                      generalized_cofactor_join)
+
+# The tables that only save work.
+computed = (build_choice, build_subst, build_generalized_cofactor)
+
+# The operations instrument counts and times, by name.
+operations = ('subst', 'constrain', 'restrict', 'satisfy')
+
+def limit_cache(size=None, policy=LossyCache):
+    "Bound the computed tables, as utils.limit_caches does."
+    limit_caches(computed, size, policy)
+
 def is_valid(claim):
     return satisfy(claim, 0) is None
 
@@ -3,14 +3,93 @@ Use BDDs to solve SAT problems, given as a list of lists of literals,
 where a literal is a nonzero int whose absolute value denotes a variable.
 """
 
+from collections import defaultdict
 import dd
+import sat
 
-def solve(clauses):
-    node = conjoin(map(disjoin, clauses))
-    return dd.satisfy(node, 1)
+def solve(clauses, order=None, roots=None):
+    """Return a satisfying env, or None. Ranks the variables by
+    order(clauses), a list of them, if given; e.g. force_order.
+    Collects garbage along the way if given roots, as in conjoin."""
+    if order is None:
+        node = conjoin(map(disjoin, clauses), roots)
+        return dd.satisfy(node, 1)
+    variables = order(clauses)
+    rank = dict((v, r) for r, v in enumerate(variables, 1))
+    node = conjoin((disjoin([rank[lit] if 0 < lit else -rank[-lit]
+                             for lit in clause])
+                    for clause in clauses), roots)
+    env = dd.satisfy(node, 1)
+    if env is None: return None
+    return dict((variables[r-1], value) for r, value in env.items())
 
-def conjoin(nodes):
-    return reduce(lambda x, y: x & y, nodes)
+def solve_all(clauses, roots=None):
+    """Generate, lazily, every satisfying env over the problem's variables.
+    Collects garbage along the way if given roots, as in conjoin."""
+    node = conjoin(map(disjoin, clauses), roots)
+    return dd.solutions(node, sat.problem_variables(clauses))
+
+def solve_weighted(nvariables, hard, soft, k=1, roots=None):
+    """Return up to k of the cheapest envs over variables 1..nvariables
+    that satisfy the hard clauses, as (cost, env) pairs, cheapest first;
+    an env's cost is the total weight of the soft (weight, clause) pairs
+    it violates, and it leaves out the variables it doesn't care about.
+    Each soft clause gets a variable of its own, after the problem's,
+    that's true just when the clause is violated and costs the clause's
+    weight; dd.k_best does the rest. Collects garbage along the way if
+    given roots, as in conjoin."""
+    weights = {}
+    nodes = list(map(disjoin, hard))
+    for i, (weight, clause) in enumerate(soft, nvariables + 1):
+        violated = ~disjoin(clause)
+        nodes.append(dd.Variable(i)(~violated, violated))
+        weights[i] = [0, weight]
+    results = []
+    for cost, env in dd.k_best(conjoin(nodes, roots), weights):
+        results.append((cost, dict((v, value) for v, value in env.items()
+                                   if v <= nvariables)))
+        if len(results) == k: break
+    return results
+
+def force_order(clauses):
+    """Return the variables in an order that tends to put variables
+    sharing a clause near each other: the FORCE heuristic of Aloul,
+    Markov and Sakallah. Each pass moves every variable to the mean
+    center of gravity of its clauses, until the total span of the
+    clauses stops shrinking."""
+    variables = sat.problem_variables(clauses)
+    clauses = [set(map(abs, clause)) for clause in clauses if clause]
+    best, best_span = variables, clause_span(clauses, variables)
+    for _ in range(len(variables)):
+        position = dict((v, p) for p, v in enumerate(best))
+        pulls = defaultdict(list)
+        for clause in clauses:
+            center = sum(position[v] for v in clause) / float(len(clause))
+            for v in clause:
+                pulls[v].append(center)
+        order = sorted(best, key=lambda v: sum(pulls[v]) / len(pulls[v]))
+        span = clause_span(clauses, order)
+        if best_span <= span: break
+        best, best_span = order, span
+    return best
+
+def clause_span(clauses, order):
+    "The sum over clauses of the distance from first to last variable."
+    position = dict((v, p) for p, v in enumerate(order))
+    return sum(max(position[v] for v in clause) - min(position[v] for v in clause)
+               for clause in clauses)
+
+def conjoin(nodes, roots=None):
+    """Return the AND of nodes. Given roots, a list of the other nodes
+    you mean to keep using (besides those dd.keep keeps), also collect
+    garbage along the way; any other node could be dropped."""
+    nodes = list(nodes)
+    result = dd.lit1
+    for i, node in enumerate(nodes):
+        result &= node
+        if roots is not None:
+            dd.collect_if_grown([result] + nodes[i+1:] + list(roots))
+    return result
 
 def disjoin(literals):
     result = dd.lit0
@@ -0,0 +1,134 @@
+"""
+Run fixed workloads on dd.py, each in a fresh process, and record wall
+time, peak node count and peak RSS, optionally comparing them with a
+baseline saved from an earlier run:
+
+    python bench.py -o base.json            # run them all, save results
+    python bench.py -b base.json            # run again, flag regressions
+    python bench.py queens-7 adder-32       # run just these
+    python bench.py -e intbdd -b base.json adder-32   # on intbdd instead
+
+The workloads import dd; with another engine, it's put in dd's place.
+"""
+
+from collections import OrderedDict
+import argparse, glob, importlib, json, os, platform, random, subprocess, sys, time
+
+engine = os.environ.get('BENCH_ENGINE', 'dd')   # (Set by the parent, for its children.)
+if engine != 'dd': sys.modules['dd'] = importlib.import_module(engine)
+
+import adder, bddsat, dd, dimacs, nqueens, roundrobin
+from instrument import recording
+
+clock = getattr(time, 'perf_counter', time.time)
+
+def solve_file(filename):
+    _, problem = dimacs.load(filename)
+    return bddsat.solve(problem, roots=[])
+
+workloads = OrderedDict()
+for n in (6, 7, 8):
+    workloads['queens-%d' % n] = (nqueens.queens_problem, n)
+for n in (8, 16, 32, 64):
+    workloads['adder-%d' % n] = (adder.test_equivalent, n, adder.ripple_carry_add,
+                                 adder.carry_lookahead_add)
+for teams, days in ((4, 4), (5, 5), (6, 5)):
+    workloads['roundrobin-%dx%d' % (teams, days)] = (roundrobin.schedule, teams, days)
+for filename in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                              'problems', '*.dimacs'))):
+    name = os.path.splitext(os.path.basename(filename))[0]
+    workloads['dimacs-' + name] = (solve_file, filename)
+
+def measure(name):
+    """Run the named workload in this process, twice: once timed, then
+    once recorded, for its peak node count. Return a dict of results."""
+    f, args = workloads[name][0], workloads[name][1:]
+    random.seed(0)
+    start = clock()
+    f(*args)
+    seconds = clock() - start
+    dd.collect([])
+    random.seed(0)
+    with recording(dd) as record:
+        f(*args)
+    unique = record.as_dict()[dd.__name__]['tables']['unique']
+    return dict(seconds=seconds, peak_nodes=unique['peak'],
+                final_nodes=unique['end'], peak_rss_kb=peak_rss_kb())
+
+def peak_rss_kb():
+    try: import resource
+    except ImportError: return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # (Bytes there.)
+
+def run(name, repeat=1, engine='dd'):
+    """Measure the named workload in repeat fresh processes, with hash
+    randomization off, on engine; keep the fastest time and the first
+    run's counts."""
+    env = dict(os.environ, PYTHONHASHSEED='0', BENCH_ENGINE=engine)
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                          '--child', name], env=env)
+        results.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+    result = results[0]
+    result['seconds'] = min(r['seconds'] for r in results)
+    return result
+
+def compare(results, baseline, tolerance):
+    """Print each result against the baseline's; return the names of the
+    workloads that got slower by more than tolerance, or grew."""
+    regressions = []
+    print('%-24s %9s %9s %6s %9s %9s %9s' % ('workload', 'seconds', 'baseline',
+                                           'ratio', 'nodes', 'baseline', 'rss_kb'))
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            print('%-24s %9.3f %9s %6s %9d %9s %9s' % (
+                name, r['seconds'], '-', '-', r['peak_nodes'], '-', r['peak_rss_kb']))
+            continue
+        ratio = r['seconds'] / max(b['seconds'], 1e-9)
+        worse = 1 + tolerance < ratio or b['peak_nodes'] < r['peak_nodes']
+        if worse: regressions.append(name)
+        print('%-24s %9.3f %9.3f %6.2f %9d %9d %9s%s' % (
+            name, r['seconds'], b['seconds'], ratio, r['peak_nodes'],
+            b['peak_nodes'], r['peak_rss_kb'], '  REGRESSED' if worse else ''))
+    return regressions
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('names', nargs='*', help='workloads to run (default all)')
+    parser.add_argument('-o', '--output', help='save the results to this JSON file')
+    parser.add_argument('-b', '--baseline', help='compare with this saved JSON file')
+    parser.add_argument('-r', '--repeat', type=int, default=1,
+                        help='runs per workload, keeping the fastest')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2,
+                        help='slowdown allowed before flagging a regression')
+    parser.add_argument('-e', '--engine', default='dd', choices=('dd', 'intbdd'),
+                        help='the module to run the workloads on, as dd')
+    parser.add_argument('-l', '--list', action='store_true', help='list the workloads')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+    if options.child:
+        print(json.dumps(measure(options.child)))
+        return 0
+    if options.list:
+        print('\n'.join(workloads))
+        return 0
+    for name in options.names:
+        if name not in workloads: parser.error('no workload %r' % name)
+    results = OrderedDict((name, run(name, options.repeat, options.engine))
+                          for name in options.names or workloads)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(dict(python=platform.python_version(), engine=options.engine,
+                           machine=platform.machine(), results=results),
+                      f, indent=1)
+    baseline = {}
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)['results']
+    return 1 if compare(results, baseline, options.tolerance) else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
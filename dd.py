@@ -1,8 +1,18 @@
 "BDDs; actually multiway and multiterminal DDs."
 
-from utils import memoize
+from bisect import bisect_left
+from fractions import Fraction
+from functools import reduce
+import heapq
+from itertools import product
+import operator
+import random
+import threading
+from utils import memoize, memoize_safely, stepwise, build_iteratively, LossyCache
 
 optimize = True
+iterative = True  # Build with explicit stacks, so deep diagrams can't overflow Python's.
+encoding = 'native'  # Or 'log', to make variables of arity over 2 out of binary ones.
 
 class Node(object):
     "A decision-diagram node."
@@ -10,20 +20,26 @@ class Node(object):
     __and__    = lambda self, other: self(lit0, other)
     __or__     = lambda self, other: self(other, lit1)
     __xor__    = lambda self, other: self(other, ~other)
+    # Where the node's variable comes in the order of testing. It's the
+    # rank here, but intbdd's can differ, after reordering.
+    level      = property(lambda self: self.rank)
 
 def Equiv(p, q):   return p(~q, q)
 def Implies(p, q): return p(lit1, q)
 
 class ConstantNode(Node):
     rank = float('Inf')  # Greater than every variable.
+    branches = ()
+    universe = None      # Constants are shared by every Manager.
     def __init__(self, value):     self.value = value
     def evaluate(self, env):       return self.value
     def __call__(self, *branches): return branches[self.value]
 
-Constant = memoize(ConstantNode)
+Constant = memoize_safely(ConstantNode)
 lit0, lit1 = Constant(0), Constant(1)
 
 def Variable(rank, arity=2):
+    if 2 < arity and encoding == 'log': return log_variable(rank, arity)
     return build_node(rank, tuple(map(Constant, range(arity))))
 
 class ChoiceNode(Node):
@@ -31,38 +47,608 @@ class ChoiceNode(Node):
     def __init__(self, rank, branches):
         self.rank = rank
         self.branches = branches
-        for b in branches: assert rank < b.rank
+        self.universe = current.manager.universe
+        for b in branches: assert rank < b.rank and b.universe in (None, self.universe)
     def evaluate(self, env):
-        return self.branches[env[self.rank]].evaluate(env)
+        node = self
+        while node.value is None:
+            try: value = env[node.rank]
+            except KeyError:
+                if not isinstance(node.rank, BitRank): raise
+                value = node.rank.of(env[node.rank.variable])
+            node = node.branches[value]
+        return node.value
     def __call__(self, *branches):
         if optimize: # (optional optimization)
             if len(set(branches)) == 1: return branches[0]
             if all(b.value == i for i, b in enumerate(branches)):
                 return self
+        if iterative: return build_choice_iteratively(self, branches)
         return build_choice(self, branches)
 
-build_node = memoize(ChoiceNode)
+build_node = memoize_safely(ChoiceNode)
 
 @memoize
 def build_choice(node, branches):
     top = min(node, *branches, key=lambda e: e.rank)
-    sbranches = tuple(subst(top.rank, c, node)(*map_subst(top.rank, c, branches))
+    sbranches = tuple(cofactor(top.rank, c, node)(*[cofactor(top.rank, c, e)
+                                                    for e in branches])
                       for c in range(len(top.branches)))
     return make_node(top.rank, sbranches)
 
+def build_choice_iteratively(node, branches):
+    """Like build_choice, sharing its memo table, but keeping the pending
+    cases on an explicit stack, as in article/iterative2.py."""
+    memos = table(build_choice)
+    key = (node, branches)
+    try: return memos[key]
+    except KeyError: pass
+    stack = [(key, top_of(key), [])]
+    while True:
+        key, top, done = stack[-1]
+        if len(done) < len(top.branches):
+            c = len(done)
+            node, branches = key
+            case = (cofactor(top.rank, c, node),
+                    tuple(cofactor(top.rank, c, e) for e in branches))
+            result = shortcut(*case)
+            if result is None: result = memos.get(case)
+            if result is None: stack.append((case, top_of(case), []))
+            else:              done.append(result)
+        else:
+            stack.pop()
+            result = memos[key] = make_node(top.rank, tuple(done))
+            if not stack: return result
+            stack[-1][2].append(result)
+
+def top_of(key):
+    node, branches = key
+    return min(node, *branches, key=lambda e: e.rank)
+
+def shortcut(node, branches):
+    "Return node(*branches) if it needs no building, else None."
+    if node.value is not None: return branches[node.value]
+    if optimize:
+        if len(set(branches)) == 1: return branches[0]
+        if all(b.value == i for i, b in enumerate(branches)):
+            return node
+    return None
+
 def make_node(rank, branches):
     if len(set(branches)) == 1: return branches[0]
     return build_node(rank, branches)
 
 def map_subst(rank, value, nodes):
-    return [subst(rank, value, e) for e in nodes]
+    return tuple(subst(rank, value, e) for e in nodes)
+
+def cofactor(rank, value, node):
+    """Like subst, but only for a rank no greater than node's, so it
+    needn't recur: this is all that build_choice needs."""
+    return node if rank < node.rank else node.branches[value]
 
 def subst(rank, value, node):
+    """Specialize node to the case where variable #rank takes the given
+    value."""
+    arity = current.manager.log_arities.get(rank)
+    if arity is not None:
+        for j in range(bits(arity)):
+            bit = BitRank(rank, j, arity)
+            node = subst(bit, bit.of(value), node)
+    if iterative: return build_subst_iteratively(rank, value, node)
+    return build_subst(rank, value, node)
+
+@memoize
+def build_subst(rank, value, node):
     if   rank <  node.rank: return node   # N.B. we get here if node is a ConstantNode
     elif rank == node.rank: return node.branches[value]
     else:                   return make_node(node.rank,
                                              map_subst(rank, value, node.branches))
 
+def build_subst_iteratively(rank, value, node):
+    """Like build_subst, sharing its memo table, but without recursion.
+    Each frame keeps its branches' results, as in build_choice_iteratively,
+    so a bounded table forgetting them can't make us redo them forever."""
+    memos = table(build_subst)
+    def known(e):
+        if rank <= e.rank: return cofactor(rank, value, e)
+        return memos.get((rank, value, e))
+    result = known(node)
+    if result is not None: return result
+    stack = [(node, [])]
+    while True:
+        e, done = stack[-1]
+        if len(done) < len(e.branches):
+            b = e.branches[len(done)]
+            result = known(b)
+            if result is None: stack.append((b, []))
+            else:              done.append(result)
+        else:
+            stack.pop()
+            result = memos[rank, value, e] = make_node(e.rank, tuple(done))
+            if not stack: return result
+            stack[-1][1].append(result)
+
+def run(f, case):
+    "Return case if it's a node, else f(*case) for f made by stepwise."
+    if not isinstance(case, tuple): return case
+    if iterative: return build_iteratively(f, case, table(f))
+    return f(*case)
+
+def exists(node, ranks):
+    """Return node with the variables of the given ranks quantified
+    away: it gives 1 wherever some values of theirs make node give 1."""
+    return quantify(node, tuple(sorted(set(bit_ranks(ranks)))), False)
+
+def forall(node, ranks):
+    """Return node with the variables of the given ranks quantified
+    away: it gives 1 wherever every value of theirs makes node give 1."""
+    return quantify(node, tuple(sorted(set(bit_ranks(ranks)))), True)
+
+def quantify(node, ranks, every):
+    return run(build_quantify, quantify_key(node, ranks, every))
+
+def quantify_key(node, ranks, every):
+    "Return node if no ranks are at or under it, else build_quantify's key."
+    ranks = ranks[bisect_left(ranks, node.rank):]
+    return (node, ranks, every) if ranks else node
+
+def quantify_cases(key, done):
+    node, ranks, every = key
+    for b in node.branches:
+        yield quantify_key(b, ranks, every)
+        if node.rank == ranks[0] and done[-1] is (lit0 if every else lit1): return
+
+def quantify_join(key, done):
+    node, ranks, every = key
+    if node.rank != ranks[0]: return make_node(node.rank, tuple(done))
+    return reduce(operator.and_ if every else operator.or_, done)
+
+build_quantify = stepwise(quantify_cases, quantify_join)
+
+def and_exists(f, g, ranks):
+    """Return exists(f & g, ranks), without building f & g: quantifying
+    on the way up keeps the intermediate results small."""
+    return conjoin_exists(f, g, tuple(sorted(set(bit_ranks(ranks)))))
+
+def conjoin_exists(f, g, ranks):
+    return run(build_conjoin_exists, conjoin_exists_key(f, g, ranks))
+
+def conjoin_exists_key(f, g, ranks):
+    "Return the result if it needs no building, else build_conjoin_exists's key."
+    if f is lit0 or g is lit0: return lit0
+    if f is lit1 or f is g:    return quantify(g, ranks, False)
+    if g is lit1:              return quantify(f, ranks, False)
+    ranks = ranks[bisect_left(ranks, min(f.rank, g.rank)):]
+    if not ranks: return f & g
+    if id(g) < id(f): f, g = g, f
+    return (f, g, ranks)
+
+def conjoin_exists_cases(key, done):
+    f, g, ranks = key
+    top = f if f.rank <= g.rank else g
+    for c in range(len(top.branches)):
+        yield conjoin_exists_key(cofactor(top.rank, c, f), cofactor(top.rank, c, g), ranks)
+        if top.rank == ranks[0] and done[-1] is lit1: return
+
+def conjoin_exists_join(key, done):
+    f, g, ranks = key
+    top = min(f.rank, g.rank)
+    if top != ranks[0]: return make_node(top, tuple(done))
+    return reduce(operator.or_, done)
+
+build_conjoin_exists = stepwise(conjoin_exists_cases, conjoin_exists_join)
+
+def constrain(node, care):
+    """Return a node agreeing with node wherever care gives 1, and
+    elsewhere taking node's value at a nearby point of care (Coudert and
+    Madre's generalized cofactor). Since it just moves points, it
+    distributes: constrain(f & g, c) is constrain(f, c) & constrain(g, c)."""
+    return generalized_cofactor(node, care, False)
+
+def restrict(node, care):
+    """Like constrain, but without bringing in care's own variables,
+    and filling the don't-care branches with the most popular care
+    branch, so the result is usually smaller though no longer
+    distributive."""
+    return generalized_cofactor(node, care, True)
+
+def generalized_cofactor(node, care, restricting):
+    return run(build_generalized_cofactor,
+               generalized_cofactor_key(node, care, restricting))
+
+def generalized_cofactor_key(node, care, restricting):
+    "Return the result if it needs no building, else the key to build it."
+    if care.value is not None or node.value is not None: return node
+    if node is care: return lit1
+    return (node, care, restricting)
+
+def generalized_cofactor_cases(key, done):
+    node, care, restricting = key
+    if restricting and care.rank < node.rank:
+        yield generalized_cofactor_key(node, reduce(operator.or_, care.branches), True)
+        return
+    top = node if node.rank <= care.rank else care
+    for c in range(len(top.branches)):
+        if cofactor(top.rank, c, care) is not lit0:
+            yield generalized_cofactor_key(cofactor(top.rank, c, node),
+                                           cofactor(top.rank, c, care), restricting)
+
+def generalized_cofactor_join(key, done):
+    node, care, restricting = key
+    if len(done) == 1: return done[0]
+    # The don't-care branches, where care is 0, take a care branch's result.
+    fill = max(done, key=done.count) if restricting else done[0]
+    top = node if node.rank <= care.rank else care
+    kept = iter(done)
+    return make_node(top.rank, tuple(fill if cofactor(top.rank, c, care) is lit0
+                                     else next(kept)
+                                     for c in range(len(top.branches))))
+
+build_generalized_cofactor = stepwise(generalized_cofactor_cases,
+                                      generalized_cofactor_join)
+
+def apply(op, f, g):
+    """Return the diagram giving op(f's value, g's value) for each env:
+    with terminals of any values, f and g are algebraic DDs (ADDs), and
+    op can be arithmetic, like operator.add or max."""
+    return run(build_apply, apply_key(op, f, g))
+
+def apply_key(op, f, g):
+    "Return the result if f and g are constants, else build_apply's key."
+    if f.value is not None and g.value is not None:
+        return Constant(op(f.value, g.value))
+    return (op, f, g)
+
+def apply_cases(key, done):
+    op, f, g = key
+    top = f if f.rank <= g.rank else g
+    for c in range(len(top.branches)):
+        yield apply_key(op, cofactor(top.rank, c, f), cofactor(top.rank, c, g))
+
+def apply_join(key, done):
+    op, f, g = key
+    return make_node(min(f.rank, g.rank), tuple(done))
+
+build_apply = stepwise(apply_cases, apply_join)
+
+def sum_out(node, variables):
+    """Return the diagram giving, for each env of the other variables,
+    the sum of node's values over all the envs of variables (as for
+    counts: a dict from rank to arity or a list of binary ranks)."""
+    return abstract(operator.add, node, variables)
+
+def max_out(node, variables):
+    "Like sum_out, but the maximum."
+    return abstract(max, node, variables)
+
+idempotent = (max, min, operator.or_, operator.and_)
+
+def abstract(op, node, variables):
+    """Return node with variables (as for sum_out) abstracted away, by
+    combining the values under each of their values with op."""
+    node = native(node)   # (So a log-encoded variable's padding isn't counted.)
+    variables = tuple(sorted(arities(node, variables).items()))
+    return run(build_abstract, abstract_key(op, node, variables))
+
+def abstract_key(op, node, variables):
+    "Return node if there's nothing to do, else build_abstract's key."
+    if op in idempotent:
+        # Node is the same under each value of the variables above it.
+        variables = variables[bisect_left(variables, (node.rank,)):]
+    return (op, node, variables) if variables else node
+
+def abstract_cases(key, done):
+    op, node, variables = key
+    (rank, arity), rest = variables[0], variables[1:]
+    if rank < node.rank:
+        yield abstract_key(op, node, rest)
+    else:
+        for b in node.branches:
+            yield abstract_key(op, b, rest if rank == node.rank else variables)
+
+def abstract_join(key, done):
+    op, node, variables = key
+    rank, arity = variables[0]
+    if node.rank < rank: return make_node(node.rank, tuple(done))
+    if rank < node.rank: done = done * arity   # (The same under each value.)
+    return reduce(lambda a, b: apply(op, a, b), done)
+
+build_abstract = stepwise(abstract_cases, abstract_join)
+
+# The tables that only save work, for limit_cache and collect.
+computed = (build_choice, build_subst, build_quantify, build_conjoin_exists,
+            build_generalized_cofactor, build_apply, build_abstract)
+
+# The operations instrument counts and times, by name.
+operations = ('subst', 'exists', 'forall', 'and_exists', 'constrain', 'restrict',
+              'apply', 'sum_out', 'max_out', 'count', 'satisfy', 'k_best',
+              'min_cost', 'collect')
+
+def limit_cache(size=None, policy=LossyCache):
+    """Bound each computed table (build_choice's, build_subst's and so
+    on) to size entries, evicting per policy, a class from utils; or with
+    size None go back to unbounded dicts. Either way the tables start
+    empty; the unique table is untouched. A bounded table's stats() tells
+    its hits, misses and evictions."""
+    tables = current.manager.tables
+    for f in computed:
+        tables[f] = {} if size is None else policy(size)
+
+def collect(roots):
+    """Drop every node that isn't reachable from roots, or from the nodes
+    kept by keep(), from the unique table, and every computed-table entry
+    that mentions a dropped node. Any node you go on using must be
+    reachable from these, or a second copy of it could get built. Return
+    the number of nodes left."""
+    manager = current.manager
+    live = reachable(list(roots) + manager.permanent)
+    drop(manager.tables[build_node], lambda key, node: node in live)
+    for f in computed:
+        drop(manager.tables[f], lambda key, result:
+             result in live and all(node in live for node in nodes_in(key)))
+    manager.collected = len(manager.tables[build_node])
+    return manager.collected
+
+def collect_if_grown(roots, factor=2):
+    """Collect if the unique table has grown by factor since the last
+    collection: cheap enough to call after every step of a big build."""
+    manager = current.manager
+    if factor * max(manager.collected, 1000) <= len(manager.tables[build_node]):
+        collect(roots)
+
+def keep(*nodes):
+    "Make collect, in the current manager, always keep nodes."
+    current.manager.permanent.extend(nodes)
+
+def reachable(roots):
+    "Return the set of nodes reachable from roots, with the constants."
+    live = set(Constant._memos.values())
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        if node not in live:
+            live.add(node)
+            stack.extend(node.branches)
+    return live
+
+def nodes_in(key):
+    "Generate the nodes in a computed-table key, even inside tuples."
+    for part in key:
+        if isinstance(part, tuple):
+            for node in nodes_in(part): yield node
+        elif isinstance(part, Node):
+            yield part
+
+def drop(memos, keep):
+    for key, result in list(memos.items()):
+        if not keep(key, result):
+            del memos[key]
+
+class Manager(object):
+    """A universe of nodes, with its own unique and computed tables.
+    The module's functions work in the current thread's current one,
+    which 'with m:' makes m for the duration; every thread starts out
+    in the same default one. Nodes from different managers don't mix
+    (but the constants are shared); dropping a manager, with its nodes,
+    frees its tables all at once. A manager can have its own cache
+    bounds, as for limit_cache, and its own variable order: a dict from
+    names to ranks, for Manager.Variable. Threads can share a manager,
+    or each work in its own without disturbing the others'."""
+    universes = 0
+    def __init__(self, cache_size=None, policy=LossyCache, order=None):
+        Manager.universes += 1
+        self.universe = Manager.universes  # (Not the manager, so no cycles.)
+        self.tables = dict((f, {} if cache_size is None else policy(cache_size))
+                           for f in computed)
+        self.tables[build_node] = {}
+        self.collected = 0      # The unique table's size after the last collect.
+        self.permanent = []     # The roots collect always keeps, from keep().
+        self.order = order or {}
+        self.log_arities = {}   # rank -> arity, of each log-encoded variable
+    def __enter__(self):
+        current.outer.append(switch(self))
+        return self
+    def __exit__(self, *exc_info):
+        switch(current.outer.pop())
+    def Variable(self, name, arity=2):
+        "Return, in this manager, the variable whose rank order gives name."
+        with self:
+            return Variable(self.order.get(name, name), arity)
+    def size(self):
+        "Return the number of nodes in the unique table."
+        return len(self.tables[build_node])
+
+class Current(threading.local):
+    "Each thread's current manager, and the ones its 'with' blocks return to."
+    def __init__(self, manager):
+        self.manager, self.outer = manager, []
+
+def switch(new):
+    "Make new this thread's current manager; return the one it replaces."
+    old, current.manager = current.manager, new
+    return old
+
+def table(f):
+    "Return the current manager's table for f."
+    return current.manager.tables[f]
+
+class CurrentTable(object):
+    """What f._memos holds, for each f with a table in every manager:
+    it stands for f's table in the current thread's current manager."""
+    __slots__ = ('f',)
+    def __init__(self, f):             self.f = f
+    def table(self):                   return current.manager.tables[self.f]
+    def replace(self, table):          current.manager.tables[self.f] = table
+    def __getitem__(self, key):        return current.manager.tables[self.f][key]
+    def __setitem__(self, key, value): current.manager.tables[self.f][key] = value
+    def __delitem__(self, key):        del current.manager.tables[self.f][key]
+    def __contains__(self, key):       return key in current.manager.tables[self.f]
+    def __len__(self):                 return len(current.manager.tables[self.f])
+    def __iter__(self):                return iter(current.manager.tables[self.f])
+    def __getattr__(self, name):       return getattr(current.manager.tables[self.f], name)
+
+current = Current(Manager())
+for f in current.manager.tables:   # (The default manager adopts the tables in place.)
+    current.manager.tables[f], f._memos = f._memos, CurrentTable(f)
+del f
+
+# Log encoding: a variable of rank r and arity k > 2 can stand for
+# bits(k) binary variables, whose ranks are BitRanks, between r and
+# anything greater, the most significant first. Codes from k up act
+# like k-1. Evaluating takes env[r] as usual, deriving the bits when
+# they're missing, and satisfy, cubes, counts and the like work in
+# terms of r too; each manager keeps track of which variables it has
+# log-encoded, in its log_arities.
+
+class BitRank(tuple):
+    "The rank of bit j of the log-encoded variable of rank variable."
+    __slots__ = ()
+    def __new__(cls, variable, j, arity):
+        return tuple.__new__(cls, (variable, j, arity))
+    variable = property(lambda self: self[0])
+    j        = property(lambda self: self[1])
+    arity    = property(lambda self: self[2])
+    def of(self, value):
+        "Return this bit of value's code."
+        return (value >> (bits(self.arity) - 1 - self.j)) & 1
+    __lt__ = lambda self, other: place(self) <  place(other)
+    __le__ = lambda self, other: place(self) <= place(other)
+    __gt__ = lambda self, other: place(self) >  place(other)
+    __ge__ = lambda self, other: place(self) >= place(other)
+
+def place(rank):
+    "A key ordering ranks and BitRanks together."
+    return rank[:2] if isinstance(rank, BitRank) else (rank, -1)
+
+def bits(arity):
+    return max(1, (arity - 1).bit_length())
+
+def bit_rank(rank, j, arity):
+    "Return the BitRank of bit j of variable rank, noting it's log-encoded."
+    current.manager.log_arities[rank] = arity
+    return BitRank(rank, j, arity)
+
+def log_variable(rank, arity):
+    return log_node(rank, arity, tuple(map(Constant, range(arity))))
+
+def log_node(rank, arity, branches):
+    "Return the binary tree of bit nodes choosing among branches."
+    n = bits(arity)
+    def tree(j, part):
+        if j == n: return part[0]
+        half = len(part) // 2
+        return make_node(bit_rank(rank, j, arity),
+                         (tree(j+1, part[:half]), tree(j+1, part[half:])))
+    return tree(0, padded(branches, n))
+
+def padded(branches, n):
+    return tuple(branches) + (branches[-1],) * (2**n - len(branches))
+
+def with_bits(env):
+    "Return env plus the bits of its log-encoded variables."
+    env = dict(env)
+    for rank, arity in current.manager.log_arities.items():
+        if rank in env:
+            for j in range(bits(arity)):
+                bit = BitRank(rank, j, arity)
+                env[bit] = bit.of(env[rank])
+    return env
+
+def bit_ranks(ranks):
+    "Return ranks plus the BitRanks of the log-encoded variables among them."
+    ranks, log_arities = list(ranks), current.manager.log_arities
+    if not log_arities: return ranks
+    return ranks + [BitRank(rank, j, log_arities[rank]) for rank in ranks
+                    if rank in log_arities for j in range(bits(log_arities[rank]))]
+
+def native(node):
+    "Return node, or to_native(node) if it tests any bits."
+    if current.manager.log_arities and any(isinstance(e.rank, BitRank) for e in postorder([node])):
+        return to_native(node)
+    return node
+
+def without_bits(env):
+    """Return env with the bits of log-encoded variables in it replaced
+    by the variables' values, taking a missing bit as 0."""
+    codes = {}
+    for bit in [rank for rank in env if isinstance(rank, BitRank)]:
+        code = codes.get(bit.variable, 0) | env.pop(bit) << (bits(bit.arity) - 1 - bit.j)
+        codes[bit.variable] = code
+        env[bit.variable] = min(code, bit.arity - 1)
+    return env
+
+def to_log(node):
+    "Return node with its variables of arity over 2 log-encoded."
+    done = {}
+    for e in postorder([node]):
+        if e.value is not None:
+            done[e] = e
+        elif isinstance(e.rank, BitRank) or len(e.branches) == 2:
+            done[e] = make_node(e.rank, tuple(done[b] for b in e.branches))
+        else:
+            done[e] = log_node(e.rank, len(e.branches), [done[b] for b in e.branches])
+    return done[node]
+
+def to_native(node):
+    "Return node with its log-encoded variables made native again."
+    done = {}
+    def code(e, rank, c):
+        "The node under e when the variable of rank has value c."
+        while isinstance(e.rank, BitRank) and e.rank.variable == rank:
+            e = e.branches[e.rank.of(c)]
+        return e
+    def convert(e):
+        if e not in done:
+            if e.value is not None:
+                done[e] = e
+            elif isinstance(e.rank, BitRank):
+                rank = e.rank.variable
+                done[e] = make_node(rank, tuple(convert(code(e, rank, c))
+                                                for c in range(e.rank.arity)))
+            else:
+                done[e] = make_node(e.rank, tuple(map(convert, e.branches)))
+        return done[e]
+    for e in postorder([node]): convert(e)   # (Bottom-up, to keep the recursion shallow.)
+    return convert(node)
+
+def log_size(node):
+    """Return the number of choice nodes to_log(node) would have, without
+    building it. (Its nodes under a variable's bits are the distinct
+    slices of branch tuples, whose halves differ.)"""
+    seen = set()
+    def walk(rank, j, part):
+        half = len(part) // 2
+        if half == 0: return
+        if part[:half] == part[half:]: return walk(rank, j+1, part[:half])
+        if (rank, j, part) not in seen:
+            seen.add((rank, j, part))
+            walk(rank, j+1, part[:half])
+            walk(rank, j+1, part[half:])
+    total = 0
+    for e in postorder([node]):
+        if e.value is None:
+            if len(e.branches) <= 2: total += 1
+            else: walk(e.rank, 0, padded(e.branches, bits(len(e.branches))))
+    return total + len(seen)
+
+def native_size(node):
+    "Return the number of choice nodes to_native(node) would have."
+    return size(to_native(node))
+
+def size(node):
+    "Return the number of choice nodes under node."
+    return sum(1 for e in postorder([node]) if e.value is None)
+
+def best_encoding(node):
+    "Return 'log' or 'native', whichever takes node fewer nodes."
+    native = to_native(node)
+    return 'log' if log_size(native) < size(native) else 'native'
+
+def recode(node, encoding=None):
+    "Return node in the given encoding, or by default the smaller one."
+    encoding = encoding or best_encoding(node)
+    return to_log(node) if encoding == 'log' else to_native(node)
+
 def is_valid(node):
     return satisfy(node, 0) is None
 
@@ -79,7 +665,287 @@ def satisfy(node, goal):
                 break
         else:
             return None
-    return env if node.value == goal else None
+    if node.value != goal: return None
+    return without_bits(env) if current.manager.log_arities else env
+
+def cubes(node, goal=1):
+    """Generate, lazily and in lexicographic order, the env along each
+    path from node to goal. Variables the path doesn't test are left
+    out: they don't matter."""
+    node = native(node)
+    live = reaching(node, goal)
+    if node not in live: return
+    env, stack = {}, [[node, 0]]
+    while stack:
+        frame = stack[-1]
+        e, value = frame
+        if e.value is not None:
+            yield dict(env)
+            stack.pop()
+        elif value == len(e.branches):
+            env.pop(e.rank, None)
+            stack.pop()
+        else:
+            frame[1] += 1
+            if e.branches[value] in live:
+                env[e.rank] = value
+                stack.append([e.branches[value], 0])
+
+def solutions(node, variables=None, goal=1):
+    """Generate, lazily, every env over variables (as for counts) for
+    which node gives goal, expanding the don't-cares of each cube."""
+    node = native(node)
+    variables = arities(node, variables)
+    ranks = sorted(variables)
+    for cube in cubes(node, goal):
+        free = [rank for rank in ranks if rank not in cube]
+        for values in product(*[range(variables[rank]) for rank in free]):
+            env = dict(cube)
+            env.update(zip(free, values))
+            yield env
+
+def reaching(node, goal):
+    "Return the set of nodes under node with a path to goal."
+    live = set()
+    for e in postorder([node]):
+        if (e.value == goal if e.value is not None
+            else any(b in live for b in e.branches)):
+            live.add(e)
+    return live
+
+def count(node, variables=None, goal=1):
+    "Return the number of envs over variables for which node gives goal."
+    return counts(node, variables).get(goal, 0)
+
+def counts(node, variables=None):
+    """Return a dict from each value node can take to the number of envs
+    over variables that give it. variables maps ranks to arities, or is
+    a list of ranks of binary variables, and must include all that node
+    tests; it defaults to node's support. (This works on bdd.py and
+    intbdd.py nodes too, in whatever order intbdd.reorder left them.)"""
+    node = native(node)
+    ranks, level, tallies = annotate(node, arities(node, variables))
+    return tallies(node, 0)
+
+def arities(node, variables):
+    "Return variables (as for counts) as a dict from rank to arity."
+    if variables is None: return support(node)
+    if isinstance(variables, dict): return variables
+    return dict.fromkeys(variables, 2)
+
+def annotate(node, variables):
+    """Tally the envs giving each value under each node under node, in
+    one bottom-up pass. Return (ranks, level, tallies): the ranks of
+    variables, in the order node tests them (see ordering); a function
+    giving a node's position in them (or len(ranks) for a constant); and
+    a function giving a node's tallies, a dict, over ranks[i:] for i up
+    to its position."""
+    nodes = postorder([node])
+    ranks = sorted(variables, key=ordering(nodes))
+    position = dict((rank, i) for i, rank in enumerate(ranks))
+    # suffix[i] is the number of envs over ranks[i:].
+    suffix = [1] * (len(ranks) + 1)
+    for i in reversed(range(len(ranks))):
+        suffix[i] = variables[ranks[i]] * suffix[i+1]
+    def level(e):
+        return len(ranks) if e.value is not None else position[e.rank]
+    def tallies(e, i):
+        scale = suffix[i] // suffix[level(e)]
+        return dict((value, n * scale) for value, n in memo[e].items())
+    memo = {}
+    for e in nodes:
+        if e.value is not None:
+            memo[e] = {e.value: 1}
+        else:
+            memo[e] = tally = {}
+            for branch in e.branches:
+                for value, n in tallies(branch, level(e) + 1).items():
+                    tally[value] = tally.get(value, 0) + n
+    return ranks, level, tallies
+
+def sampler(node, variables=None, goal=1):
+    """Return a function that draws an env over variables (as for
+    counts) uniformly from those for which node gives goal, taking an
+    optional random.Random; or None if there are none. Annotating
+    node with counts takes one pass; then each draw takes a step per
+    variable."""
+    node = native(node)
+    variables = arities(node, variables)
+    ranks, level, tallies = annotate(node, variables)
+    if not tallies(node, 0).get(goal): return None
+    def draw(rng=random):
+        env, e, i = {}, node, 0
+        while True:
+            for rank in ranks[i:level(e)]:
+                env[rank] = rng.randrange(variables[rank])
+            if e.value is not None:
+                return env
+            i = level(e) + 1
+            weights = [tallies(b, i).get(goal, 0) for b in e.branches]
+            pick = rng.randrange(sum(weights))
+            for value, weight in enumerate(weights):
+                if pick < weight: break
+                pick -= weight
+            env[e.rank] = value
+            e = e.branches[value]
+    return draw
+
+def sample_array(node, n, variables=None, goal=1, seed=None):
+    """Return an n-row NumPy array of independent uniform draws as from
+    sampler(), one column per variable in order of rank; or None if
+    there are none. All n samples step down the diagram together, with
+    the branch probabilities rounded to floats."""
+    import numpy as np
+    node = native(node)
+    variables = arities(node, variables)
+    ranks, level, tallies = annotate(node, variables)
+    if not tallies(node, 0).get(goal): return None
+    nodes = postorder([node])
+    index = dict((e, k) for k, e in enumerate(nodes))
+    width = max([len(e.branches) for e in nodes] + [1])
+    levels = np.array([level(e) for e in nodes])
+    children = np.zeros((len(nodes), width), dtype=np.intp)
+    bounds = np.full((len(nodes), width), np.inf)
+    for k, e in enumerate(nodes):
+        if e.value is None:
+            weights = [tallies(b, level(e) + 1).get(goal, 0) for b in e.branches]
+            total, below = sum(weights), 0
+            for value, (b, weight) in enumerate(zip(e.branches, weights)):
+                children[k, value] = index[b]
+                below += weight
+                if value + 1 < len(weights):
+                    bounds[k, value] = float(Fraction(below, total))
+    rng = np.random.default_rng(seed)
+    out = np.empty((n, len(ranks)), dtype=np.int64)
+    column = dict((rank, j) for j, rank in enumerate(sorted(ranks)))
+    at = np.full(n, index[node], dtype=np.intp)
+    for i, rank in enumerate(ranks):
+        j = column[rank]
+        out[:, j] = rng.integers(variables[rank], size=n)
+        here = levels[at] == i
+        if here.any():
+            k = at[here]
+            u = rng.random(len(k))
+            values = (u[:, None] >= bounds[k]).sum(axis=1)
+            out[here, j] = values
+            at[here] = children[k, values]
+    return out
+
+def evaluate_array(node, envs, variables=None):
+    """Return a NumPy vector of node.evaluate(env) for each row of envs,
+    a 2-D array whose columns give the values of variables, a list of
+    ranks defaulting to node's support in order of rank (as from
+    sample_array). All rows step down the diagram together, a variable
+    at a time, in the order it tests them. (This works on bdd.py and
+    intbdd.py nodes too, in whatever order intbdd.reorder left them.)"""
+    import numpy as np
+    node = native(node)
+    envs = np.asarray(envs)
+    if variables is None: variables = sorted(support(node))
+    column = dict((rank, i) for i, rank in enumerate(variables))
+    nodes = postorder([node])
+    index = dict((e, k) for k, e in enumerate(nodes))
+    width = max([len(e.branches) for e in nodes] + [1])
+    children = np.zeros((len(nodes), width), dtype=np.intp)
+    for k, e in enumerate(nodes):
+        for value, b in enumerate(e.branches):
+            children[k, value] = index[b]
+    ranks = sorted(set(e.rank for e in nodes if e.value is None), key=ordering(nodes))
+    position = dict((rank, i) for i, rank in enumerate(ranks))
+    levels = np.array([len(ranks) if e.value is not None else position[e.rank]
+                       for e in nodes])
+    some = nodes[0].value  # (A constant's, to fill the choice nodes' slots.)
+    values = np.array([some if e.value is None else e.value for e in nodes])
+    at = np.full(len(envs), index[node], dtype=np.intp)
+    for i, rank in enumerate(ranks):
+        here = np.flatnonzero(levels[at] == i)
+        if len(here):
+            at[here] = children[at[here], envs[here, column[rank]]]
+    return values[at]
+
+def min_cost(node, weights, goal=1):
+    """Return (cost, env) for a cheapest env for which node gives goal,
+    or None if there's none. weights maps a variable's rank to a list
+    of the costs of its values; the cost of env is their sum, and env
+    includes every variable in weights, with the others node tests on
+    the way. Takes one pass over node."""
+    for cost, env in k_best(node, weights, 1, goal):
+        return cost, env
+    return None
+
+def k_best(node, weights, k=None, goal=1):
+    """Generate up to k (or all) (cost, env) pairs as for min_cost,
+    cheapest first. Variables out of weights that a path skips are left
+    out of its env, so each env stands for all its extensions. A* over
+    the diagram, guided by the exact cheapest cost below each node."""
+    node = native(node)
+    floor = sum(min(costs) for costs in weights.values())
+    extra = dict((rank, [c - min(costs) for c in costs])
+                 for rank, costs in weights.items())
+    below = cheapest_below(node, extra, goal)
+    if below[node] == float('Inf'): return
+    ranks = sorted(set(extra) | set(support(node)), key=ordering(postorder([node])))
+    heap = [(below[node], 0, 0, node, 0, ())]
+    serial = 1   # (Tie-breaks, so the heap never compares nodes.)
+    while heap and k != 0:
+        bound, _, paid, e, i, chosen = heapq.heappop(heap)
+        while i < len(ranks) and e.rank != ranks[i] and ranks[i] not in extra:
+            i += 1   # (A variable node skips and nobody weighs.)
+        if i == len(ranks):
+            yield floor + paid, dict(chosen)
+            if k is not None: k -= 1
+            continue
+        rank = ranks[i]
+        costs = extra.get(rank)
+        if e.rank == rank: options = enumerate(e.branches)
+        else:              options = ((value, e) for value in range(len(costs)))
+        for value, child in options:
+            step = costs[value] if costs else 0
+            if below[child] < float('Inf'):
+                heapq.heappush(heap, (paid + step + below[child], serial,
+                                      paid + step, child, i + 1,
+                                      chosen + ((rank, value),)))
+                serial += 1
+
+def cheapest_below(node, extra, goal):
+    """Return a dict from each node under node to the least extra cost
+    of reaching goal from it, counting only the variables it tests."""
+    below = {}
+    for e in postorder([node]):
+        if e.value is not None:
+            below[e] = 0 if e.value == goal else float('Inf')
+        else:
+            costs = extra.get(e.rank)
+            below[e] = min((costs[value] if costs else 0) + below[b]
+                           for value, b in enumerate(e.branches))
+    return below
+
+def support(node):
+    "Return a dict from the rank of each variable node tests to its arity."
+    return dict((e.rank.variable, e.rank.arity) if isinstance(e.rank, BitRank)
+                else (e.rank, len(e.branches))
+                for e in postorder([node]) if e.value is None)
+
+def ordering(nodes):
+    """Return a sort key for ranks that puts the variables nodes test in
+    order of level, as they're tested; the others go by rank."""
+    levels = dict((e.rank, e.level) for e in nodes if e.value is None)
+    return lambda rank: levels.get(rank, rank)
+
+def postorder(roots):
+    """Return a list of the nodes reachable from roots, each after all
+    of its branches."""
+    seen, order = set(), []
+    stack = [(root, False) for root in reversed(roots)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+        elif node not in seen:
+            seen.add(node)
+            stack.append((node, True))
+            stack.extend((b, False) for b in reversed(node.branches))
+    return order
 
 
 ## x, y = map(Variable, (8, 9))
@@ -109,8 +975,39 @@ def satisfy(node, goal):
 ## is_valid(Implies(Implies(Implies(x, y), x), y))
 #. False
 
+## count(x | y), count(x | y, [7, 8, 9]), count(x ^ y, goal=0)
+#. (3, 6, 2)
+## list(cubes(x | y)), list(cubes(x | y, 0))
+#. ([{8: 0, 9: 1}, {8: 1}], [{8: 0, 9: 0}])
+## list(solutions(x, [8, 9]))
+#. [{8: 1, 9: 0}, {8: 1, 9: 1}]
+## exists(x & y, [9]) is x, forall(x | y, [9]) is x, and_exists(x, ~x | y, [8]) is y
+#. (True, True, True)
+## evaluate_array(x | y, [[0, 0], [0, 1], [1, 0]]).tolist()
+#. [0, 1, 1]
+## constrain(x ^ y, x) is ~y, restrict(x & y, Variable(5) & y) is x
+#. (True, True)
+## with Manager() as m: z = Variable(8) & Variable(9)
+## z is x & y, m.size()
+#. (False, 3)
+## counts(apply(operator.add, x, y)), sum_out(x | y, [8, 9]).value
+#. ({0: 1, 1: 2, 2: 1}, 3)
+## max_out(apply(operator.add, x, Constant(10)), [8]).value
+#. 11
+## min_cost(x | y, {8: [0, 5], 9: [0, 2]})
+#. (2, {8: 0, 9: 1})
+## [cost for cost, env in k_best(x | y, {8: [0, 5], 9: [0, 2]})]
+#. [2, 5, 7]
+## u = Variable(21, 5)
+## size(to_log(u)), log_size(u), best_encoding(u), to_native(to_log(u)) is u
+#. (4, 4, 'native', True)
+## t = Variable(5, 3)
+## counts(t(x, lit1, Constant(7)))
+#. {0: 1, 1: 3, 7: 2}
+
 
 a, b, c, d, p, q, r = map(Variable, range(7))
+keep(a, b, c, d, p, q, r)
 
 ## is_valid(Equiv(a, lit0(a, b)))
 #. True
@@ -130,3 +1027,5 @@ a, b, c, d, p, q, r = map(Variable, range(7))
 #. True
 ## is_valid(~(q(p(a, b), p(c, d)) ^ p(q(a, c), q(b, d))))
 #. True
+## collect([]), Variable(0) is a
+#. (7, True)
@@ -0,0 +1,147 @@
+"""
+Compile a decision diagram into a flat Python function, for when it's
+fixed and you'll evaluate it many times. Works on dd.py, bdd.py and
+intbdd.py nodes alike.
+
+Each node with one parent gets inlined into it as an if-statement; the
+shared nodes each get a block of their own, in order from the root,
+and a path reaching one sets s to its number and falls through to it.
+The blocks come in runs, each skipped with one comparison when s is
+past it, so the falling through takes O(sqrt(blocks)). The terminal
+values are looked up in a tuple, so the code depends only on the
+diagram's shape, which is what the on-disk cache is keyed by.
+"""
+
+import hashlib, marshal, os, stat, sys
+from dd import BitRank, bits, postorder
+
+# Where compiled code objects are kept between runs; None for nowhere.
+# Code gets loaded from here and run, so it must be a directory only
+# you can write to: it's made so, and a cache anyone else could write
+# to is ignored.
+cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME')
+                         or os.path.join(os.path.expanduser('~'), '.cache'),
+                         'ddcompile')
+
+# Deeper nodes get their own block, to stay within the parser's limits.
+max_depth = 40
+
+version = 2  # Of the generated code, to bump when to_source changes.
+
+def compile_diagram(node):
+    """Return a function of an env, as for node.evaluate, that computes
+    the same value, without recursion or method calls."""
+    nodes = postorder([node])
+    values = tuple(e.value for e in nodes if e.value is not None)
+    path = cache_path(nodes)
+    code = load_code(path)
+    if code is None:
+        code = compile(to_source(node, nodes), '<diagram>', 'exec')
+        save_code(path, code)
+    namespace = {'V': values}
+    exec(code, namespace)
+    return namespace['evaluate']
+
+def to_source(node, nodes=None):
+    "Return the source code compile_diagram would compile for node."
+    nodes = nodes or postorder([node])
+    terminal = dict((e, j) for j, e in enumerate(e for e in nodes
+                                                 if e.value is not None))
+    parents = dict.fromkeys(nodes, 0)
+    for e in nodes:
+        for b in e.branches: parents[b] += 1
+    blocks = set(e for e in nodes if parents[e] != 1) | set([node])
+    number = dict((e, k) for k, e in enumerate(reversed(nodes)))
+    def emit(e, depth, lines, inline=True):
+        indent = '    ' * depth
+        if e.value is not None:
+            lines.append(indent + 'return V[%d]' % terminal[e])
+        elif inline and (e in blocks or max_depth < depth):
+            blocks.add(e)
+            lines.append(indent + 's = %d' % number[e])
+        elif len(e.branches) == 2:
+            lines.append(indent + 'if %s:' % test(e.rank))
+            emit(e.branches[1], depth+1, lines)
+            lines.append(indent + 'else:')
+            emit(e.branches[0], depth+1, lines)
+        else:
+            lines.append(indent + 'v = env[%r]' % e.rank)
+            last = len(e.branches) - 1
+            for value, b in enumerate(e.branches):
+                lines.append(indent + ('if v == 0:' if value == 0 else
+                                       'else:' if value == last else
+                                       'elif v == %d:' % value))
+                emit(b, depth+1, lines)
+    bodies = {}
+    for e in reversed(nodes):   # (Parents first, so blocks only grows ahead.)
+        if e is node or (e in blocks and e.value is None):
+            bodies[number[e]] = body = []
+            emit(e, 0, body, False)
+    lines = ['def evaluate(env, V=V):']
+    def place(body, depth):
+        lines.extend('    ' * depth + line for line in body)
+    place(bodies.pop(number[node]), 1)
+    ks = sorted(bodies)
+    run = max(1, int(len(ks) ** .5))
+    for i in range(0, len(ks), run):
+        chunk = ks[i:i+run]
+        lines.append('    if s <= %d:' % chunk[-1])
+        for k in chunk:
+            lines.append('        if s == %d:' % k)
+            place(bodies[k], 3)
+    return '\n'.join(lines) + '\n'
+
+def test(rank):
+    "Return the code for a binary variable's value, or a log-encoded one's bit."
+    if isinstance(rank, BitRank):
+        return 'env[%r] >> %d & 1' % (rank.variable, bits(rank.arity) - 1 - rank.j)
+    return 'env[%r]' % (rank,)
+
+def signature(nodes):
+    "Return a hash of the shape of the diagram of nodes, from postorder()."
+    index = dict((e, k) for k, e in enumerate(nodes))
+    shape = ['version %d, max_depth %d' % (version, max_depth)]
+    for e in nodes:
+        if e.value is not None: shape.append('.')
+        else: shape.append('%r %s' % (e.rank, ' '.join(str(index[b])
+                                                         for b in e.branches)))
+    return hashlib.sha1('\n'.join(shape).encode('ascii')).hexdigest()
+
+def cache_path(nodes):
+    if cache_dir is None: return None
+    tag = 'py%d%d' % sys.version_info[:2]
+    return os.path.join(cache_dir, '%s.%s' % (signature(nodes), tag))
+
+def load_code(path):
+    if path is None or not (trusted(cache_dir) and trusted(path)): return None
+    try:
+        with open(path, 'rb') as f:
+            return marshal.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError): return None
+
+def save_code(path, code):
+    "Cache code at path if we can; the cache only saves work, so never fail."
+    if path is None: return
+    temp = '%s.%d' % (path, os.getpid())
+    try:
+        if not os.path.isdir(cache_dir): os.makedirs(cache_dir, 0o700)
+        if not trusted(cache_dir): return
+        with open(temp, 'wb') as f:
+            marshal.dump(code, f)
+        os.rename(temp, path)  # (Atomic, so a racing reader sees all or nothing.)
+    except (IOError, OSError):  # (E.g. a read-only home, or a racing makedirs.)
+        try: os.remove(temp)
+        except OSError: pass
+
+def trusted(path):
+    "Whether path exists, belongs to us, and nobody else can write to it."
+    try: info = os.stat(path)
+    except OSError: return False
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid(): return False
+    return not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+## import dd
+## x, y, t = dd.Variable(1), dd.Variable(2), dd.Variable(3, 3)
+## f = compile_diagram(t(x, x & y, dd.Constant('z')))
+## [f({1: a, 2: b, 3: c}) for a, b, c in [(1, 0, 0), (1, 0, 1), (0, 0, 2)]]
+#. [1, 0, 'z']
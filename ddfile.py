@@ -0,0 +1,139 @@
+"""
+Save decision diagrams to a compact binary file, and load them back
+without parsing: the file is mapped into memory and a node gets built
+only when a root that reaches it is asked for. Saving works on dd.py,
+bdd.py and intbdd.py nodes alike; loading rebuilds in any of them.
+
+The file is a header, then four arrays of 32-bit ints in native byte
+order, then the terminal values. The nodes come in postorder, so each
+node's branches come before it:
+  ranks[i]     the rank of node i, or for a constant its value's index
+  starts[i]    where node i's branches start in children; the constants
+               are the nodes with no branches
+  children[j]  the index of a node
+  roots[r]     the index of the rth root
+The values are written as the repr of a tuple, so they must be literals,
+along with a dict from the index of each node that tests a bit of a
+log-encoded variable (in dd.py) to its bit number and arity; its rank
+is the variable's.
+"""
+
+import ast, mmap, struct, sys
+import dd
+from dd import postorder
+
+magic = b'DD2' + sys.byteorder[0].encode('ascii')
+header = struct.Struct('=4s4I')  # magic; numbers of nodes, children, roots, value bytes
+word = struct.Struct('=i')
+
+def save(filename, roots):
+    "Write the diagrams under the nodes in roots to the named file."
+    with open(filename, 'wb') as f:
+        f.write(dumps(roots))
+
+def dumps(roots):
+    "Return the contents save would write, as bytes."
+    nodes = postorder(roots)
+    index = dict((e, i) for i, e in enumerate(nodes))
+    values, value_index = [], {}
+    ranks, starts, children, bits = [], [0], [], {}
+    for e in nodes:
+        if e.value is not None:
+            if e.value not in value_index:
+                value_index[e.value] = len(values)
+                values.append(e.value)
+            ranks.append(value_index[e.value])
+        elif isinstance(e.rank, dd.BitRank):
+            ranks.append(e.rank.variable)
+            bits[len(ranks) - 1] = (e.rank.j, e.rank.arity)
+            children.extend(index[b] for b in e.branches)
+        else:
+            ranks.append(e.rank)
+            children.extend(index[b] for b in e.branches)
+        starts.append(len(children))
+    text = repr((tuple(values), bits)).encode('utf-8')
+    words = ranks + starts + children + [index[root] for root in roots]
+    return (header.pack(magic, len(nodes), len(children), len(roots), len(text))
+            + pack_words(words) + text)
+
+def pack_words(words):
+    return struct.pack('=%di' % len(words), *words)
+
+def load(filename, module=dd):
+    """Return a Diagrams over the named file, rebuilding nodes in module
+    (dd, bdd or intbdd) as they're asked for."""
+    with open(filename, 'rb') as f:
+        return Diagrams(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), module)
+
+def loads(data, module=dd):
+    "Like load, but from the bytes dumps returns."
+    return Diagrams(data, module)
+
+class Diagrams(object):
+    """The roots of a saved file, as a sequence of nodes. Each is built
+    on first access, along with the nodes under it that aren't built yet;
+    nodes shared between roots get built once."""
+    def __init__(self, data, module):
+        tag, n, m, r, t = header.unpack_from(data, 0)
+        if tag != magic:
+            raise ValueError('Not a decision-diagram file of this byte order')
+        at = header.size
+        self.ranks    = words(data, at, n);    at += 4*n
+        self.starts   = words(data, at, n+1);  at += 4*(n+1)
+        self.children = words(data, at, m);    at += 4*m
+        self.roots    = words(data, at, r);    at += 4*r
+        self.values, self.bits = ast.literal_eval(bytes(data[at:at+t]).decode('utf-8'))
+        self.data, self.module = data, module
+        self.built = {}
+    def __len__(self):
+        return len(self.roots)
+    def __getitem__(self, r):
+        return self.build(self.roots[r])
+    def build(self, i):
+        "Return node i, building whatever under it isn't built yet."
+        if i in self.built: return self.built[i]
+        todo, stack = set(), [i]
+        while stack:
+            j = stack.pop()
+            if j not in self.built and j not in todo:
+                todo.add(j)
+                stack.extend(self.branch_indices(j))
+        for j in sorted(todo):   # (Postorder puts branches first.)
+            self.built[j] = self.make(j)
+        return self.built[i]
+    def branch_indices(self, i):
+        return [self.children[j] for j in range(self.starts[i], self.starts[i+1])]
+    def make(self, i):
+        branches = [self.built[j] for j in self.branch_indices(i)]
+        if not branches:
+            return self.module.Constant(self.values[self.ranks[i]])
+        rank = self.ranks[i]
+        if i in self.bits:
+            if self.module is not dd:
+                raise ValueError('Log-encoded variables load only into dd')
+            rank = dd.bit_rank(rank, *self.bits[i])
+        if self.module is dd: return dd.make_node(rank, tuple(branches))
+        if len(branches) == 2: return self.module.Variable(rank)(*branches)
+        return self.module.Variable(rank, len(branches))(*branches)
+
+def words(data, offset, n):
+    "Return a sequence viewing n words of data from offset, without copying."
+    try:
+        return memoryview(data)[offset:offset + 4*n].cast('i')
+    except (AttributeError, TypeError):   # (Python 2's memoryview can't cast.)
+        return Words(data, offset, n)
+
+class Words(object):
+    def __init__(self, data, offset, n):
+        self.data, self.offset, self.n = data, offset, n
+    def __len__(self):
+        return self.n
+    def __getitem__(self, i):
+        if not 0 <= i < self.n: raise IndexError(i)
+        return word.unpack_from(self.data, self.offset + 4*i)[0]
+
+## x, y, t = dd.Variable(1), dd.Variable(2), dd.Variable(3, 3)
+## f, g = x & y, t(x, x & y, dd.Constant('z'))
+## diagrams = loads(dumps([f, g]))
+## len(diagrams), diagrams[0] is f, diagrams[1] is g
+#. (2, True, True)
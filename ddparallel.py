@@ -0,0 +1,47 @@
+"""
+Conjoin many dd.py nodes in a balanced tree, as roundrobin.conjoin_pairwise
+does, but with the merges of each level running in a pool of processes.
+The operands and results travel in ddfile's node-array format, and each
+merge is built in a Manager of its own, freed when it's done; the parent
+re-interns the results in its current manager.
+"""
+
+import multiprocessing
+import dd, ddfile
+
+def conjoin(nodes, processes=None, min_nodes=2000):
+    """Return the conjunction of nodes, merging neighbors level by level.
+    Merges of operands under min_nodes nodes between them happen here,
+    as shipping them costs more than it saves; processes is the pool
+    size, defaulting to the number of CPUs."""
+    nodes = list(nodes) or [dd.lit1]
+    pool = None
+    try:
+        while len(nodes) > 1:
+            pairs = [(nodes[i], nodes[i+1]) for i in range(0, len(nodes) - 1, 2)]
+            big = [len(dd.postorder(pair)) >= min_nodes for pair in pairs]
+            if any(big) and pool is None:
+                pool = multiprocessing.Pool(processes)
+            pending = [pool.apply_async(merge, (ddfile.dumps(pair),)) if ship else None
+                       for pair, ship in zip(pairs, big)]
+            merged = [ddfile.loads(job.get())[0] if job else a & b
+                      for (a, b), job in zip(pairs, pending)]
+            if len(nodes) % 2: merged.append(nodes[-1])
+            nodes = merged
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return nodes[0]
+
+def merge(data):
+    "Conjoin the two roots in data, in a fresh manager; return the result's data."
+    with dd.Manager():
+        a, b = ddfile.loads(data)
+        return ddfile.dumps([a & b])
+
+## import roundrobin
+## variables = roundrobin.make_variables(4, 3)
+## constraints = roundrobin.make_constraints(4, 3, variables)
+## conjoin(constraints, min_nodes=0) is roundrobin.conjoin_pairwise(constraints)
+#. True
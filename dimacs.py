@@ -46,3 +46,39 @@ def load_file(f):
         clauses.append(clause)
     assert nclauses == len(clauses)
     return nvariables, clauses
+
+def load_wcnf(filename):
+    return load_wcnf_file(open(filename))
+
+def load_wcnf_file(f):
+    """Read weighted MaxSAT clauses, in the old format ('p wcnf' with a
+    weight before each clause, weights of at least top marking the hard
+    ones) or the 2022 one (hard clauses after an 'h', no header). Return
+    nvariables, the hard clauses, and a list of (weight, clause)."""
+    nvariables = 0
+    top = None
+    hard, soft = [], []
+    tokens = []
+    for line in f:
+        if line.startswith('c'):
+            continue
+        if line.startswith('p'):
+            fields = line.split()
+            if fields[:2] != ['p', 'wcnf']:
+                raise Exception('Not in DIMACS WCNF format')
+            nvariables = int(fields[2])
+            if len(fields) > 4: top = int(fields[4])
+        else:
+            tokens.extend(line.split())
+    i = 0
+    while i < len(tokens):
+        weight = tokens[i]
+        j = tokens.index('0', i+1)
+        clause = [int(lit) for lit in tokens[i+1:j]]
+        if weight == 'h' or (top is not None and int(weight) >= top):
+            hard.append(clause)
+        else:
+            soft.append((int(weight), clause))
+        nvariables = max([nvariables] + [abs(lit) for lit in clause])
+        i = j + 1
+    return nvariables, hard, soft
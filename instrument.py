@@ -0,0 +1,167 @@
+"""
+Measure what the decision-diagram engines do over a stretch of code:
+
+    with recording(dd) as record:
+        nqueens.queens(8)
+    print(record.to_json())
+
+For each engine module (dd, bdd, intbdd or zdd) it tells the unique
+table's size before and after and at its peak, the hits and misses of
+each table, how often each operation (as the module's operations list
+them) got called, and the seconds spent in each operation called from
+outside the engine. Outside a recording nothing is wrapped, so it costs
+nothing.
+"""
+
+from contextlib import contextmanager
+import json, time
+from utils import BoundedCache
+
+operators = dict(__and__='and', __or__='or', __xor__='xor', __invert__='not',
+                 __sub__='difference')
+
+@contextmanager
+def recording(*modules):
+    """Record the engines in modules while the block runs; yield a
+    Record, which holds the results from then on."""
+    record = Record()
+    undo = []
+    try:
+        for module in modules:
+            watch(module, record.engine(module.__name__), undo)
+        yield record
+    finally:
+        for restore in reversed(undo): restore()
+        record.finish()
+
+class Record(object):
+    def __init__(self):
+        self.engines = {}
+    def engine(self, name):
+        return self.engines.setdefault(name, dict(tables={}, calls={}, seconds={}))
+    def finish(self):
+        for stats in self.engines.values():
+            for table in stats['tables'].values():
+                table.pop('finish')()
+    def as_dict(self):
+        return dict((name, dict((part, dict(table)) for part, table in stats.items()))
+                    for name, stats in self.engines.items())
+    def to_json(self, **options):
+        options.setdefault('indent', 1)
+        return json.dumps(self.as_dict(), sort_keys=True, **options)
+
+def watch(module, stats, undo):
+    for name, owner, attr in tables_of(module):
+        stats['tables'][name] = watch_table(owner, attr, undo, name == 'unique')
+    for cls in set(c for c in vars(module).values()
+                   if isinstance(c, type) and issubclass(c, module.Node)):
+        for attr, name in operators.items():
+            if attr in vars(cls): wrap(cls, attr, name, stats, undo)
+        if '__call__' in vars(cls) and cls.__name__ != 'ConstantNode':
+            wrap(cls, '__call__', 'choice', stats, undo)
+    for name in module.operations:
+        wrap(module, name, name, stats, undo)
+
+def tables_of(module):
+    "Generate (name, owner, attribute) for each of module's tables."
+    if hasattr(module, 'unique'):   # (intbdd keeps its tables in globals.)
+        yield 'unique', module, 'unique'
+        yield 'choices', module, 'choices'
+    else:
+        yield 'unique', module.build_node, '_memos'
+        for name, f in sorted(vars(module).items()):
+            if f in module.computed:   # (Their __name__s are all 'memoized'.)
+                yield name, f, '_memos'
+
+def watch_table(owner, attr, undo, unique):
+    "Count the lookups in a table, swapping in a counting copy if it's a dict."
+    table = get_table(owner, attr)
+    stats = dict(start=len(table), peak=len(table))
+    if isinstance(table, BoundedCache):
+        before = table.stats()
+        def finish():
+            after = table.stats()
+            stats.update(end=len(table), peak=max(stats['start'], len(table)),
+                         hits=after['hits'] - before['hits'],
+                         misses=after['misses'] - before['misses'])
+    else:
+        counting = CountingDict(table)
+        counting.stats = stats if unique else None
+        set_table(owner, attr, counting)
+        def restore():
+            if get_table(owner, attr) is counting:
+                set_table(owner, attr, dict(counting))
+        undo.append(restore)
+        def finish():
+            stats.update(end=len(get_table(owner, attr)), hits=counting.hits,
+                         misses=counting.misses)
+            stats['peak'] = max(stats['peak'], stats['end'])
+    stats['finish'] = finish
+    return stats
+
+def get_table(owner, attr):
+    "Return owner.attr, or the table it stands for, as for dd.py's managers."
+    table = getattr(owner, attr)
+    return table.table() if hasattr(type(table), 'replace') else table
+
+def set_table(owner, attr, table):
+    standin = getattr(owner, attr)
+    if hasattr(type(standin), 'replace'): standin.replace(table)
+    else: setattr(owner, attr, table)
+    if attr == 'unique': owner.build_node._memos = table
+
+class CountingDict(dict):
+    "A dict that counts its lookups, and tracks its peak size in stats."
+    hits = misses = 0
+    stats = None
+    def __getitem__(self, key):
+        try: value = dict.__getitem__(self, key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        return value
+    def get(self, key, default=None):
+        try: return self[key]
+        except KeyError: return default
+    def __contains__(self, key):
+        found = dict.__contains__(self, key)
+        if found: self.hits += 1
+        else:     self.misses += 1
+        return found
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        if self.stats is not None and self.stats['peak'] < len(self):
+            self.stats['peak'] = len(self)
+
+def wrap(owner, attr, name, stats, undo):
+    "Count and time the calls to owner.attr, under name."
+    f = vars(owner)[attr]
+    calls, seconds = stats['calls'], stats['seconds']
+    calls.setdefault(name, 0)
+    def wrapper(*args, **kwargs):
+        calls[name] += 1
+        if depth[0]: return f(*args, **kwargs)
+        depth[0] = 1
+        start = time.time()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            depth[0] = 0
+            seconds[name] = seconds.get(name, 0) + time.time() - start
+    if hasattr(f, '__dict__'):
+        wrapper.__dict__ = f.__dict__   # (Sharing attributes like collect.size.)
+    setattr(owner, attr, wrapper)
+    def restore():
+        if vars(owner).get(attr) is wrapper: setattr(owner, attr, f)
+    undo.append(restore)
+
+depth = [0]   # Whether we're inside some wrapped call, so only the outer one's timed.
+
+## import dd
+## with recording(dd) as record:
+##     x, y = dd.Variable(1), dd.Variable(2)
+##     z = x & y
+## stats = record.as_dict()['dd']
+## stats['calls']['and'], stats['tables']['unique']['peak'] >= 3
+#. (1, True)
@@ -0,0 +1,401 @@
+"""
+Binary BDDs with the nodes stored in parallel integer arrays, after
+lua/bdd5.lua. A Node here is only a thin handle on a node's index, with
+the same operators as dd.py's nodes, so a client of dd.py that sticks
+to binary variables can `import intbdd as dd` and run unchanged. The
+handles on each node are counted, so that collect() never frees a node
+some handle still refers to, only to reuse it for a different one.
+
+A node is referred to by an edge: its index times 2, plus 1 if the
+edge is complemented. With complement_edges on, a node and its negation
+share storage, and ~ is O(1); make_node keeps the if0 edge of every
+stored node regular so that the representation stays canonical.
+"""
+
+from array import array
+from utils import LossyCache
+
+complement_edges = True     # (Set before building any nodes.)
+iterative = True            # Build with an explicit stack instead of recursion.
+auto_reorder = False        # Let collect_if_grown sift the variable order.
+
+# Node #0 is the constant 0, so edge 0 means 0 and edge 1 means 1. (With
+# complement_edges off, edge 1 is the only complemented edge there is.)
+# Any other node #i tests the variable at level ranks[i] and goes on to
+# edge if0s[i] or if1s[i]. A variable's level is its rank until
+# reorder() permutes them.
+infinite_rank = 2**31 - 1   # Variable ranks must be less than this.
+ranks = array('i', [infinite_rank])
+if0s  = array('i', [0])
+if1s  = array('i', [0])
+handles = array('i', [0])   # How many Nodes refer to each index.
+
+id_bits = 28                # Edges must be less than 2**id_bits.
+
+def pack(x, y, z):
+    """Return an int uniquely determined by x, y, z, where y and z are
+    edges. (Unlike in Lua, we're not limited to 53 bits.)"""
+    return (((x << id_bits) + y) << id_bits) + z
+
+def unpack(key):
+    "Return (x, y, z), given pack(x, y, z)."
+    mask = (1 << id_bits) - 1
+    return key >> 2*id_bits, (key >> id_bits) & mask, key & mask
+
+unique = {}                 # pack(rank, if0, if1) -> regular edge
+free = []                   # Indices of collected nodes, for reuse
+
+def build_node(rank, if0, if1):
+    key = pack(rank, if0, if1)
+    try: return unique[key]
+    except KeyError:
+        assert rank < ranks[if0 >> 1] and rank < ranks[if1 >> 1]
+        if free:
+            i = free.pop()
+            ranks[i], if0s[i], if1s[i] = rank, if0, if1
+        else:
+            i = len(ranks)
+            assert i << 1 < 2**id_bits
+            ranks.append(rank)
+            if0s.append(if0)
+            if1s.append(if1)
+            handles.append(0)
+        node = unique[key] = i << 1
+        return node
+build_node._memos = unique  # (Like dd.build_node's, for counting nodes.)
+
+def make_node(rank, if0, if1):
+    if if0 == if1: return if0
+    if complement_edges and if0 & 1:
+        return build_node(rank, if0 ^ 1, if1 ^ 1) ^ 1
+    return build_node(rank, if0, if1)
+
+def negate(node):
+    return node ^ 1 if complement_edges else choose(node, 1, 0)
+
+def choose(node, if0, if1):
+    "Return the edge to node(if0, if1), given edges."
+    case = simplify(node, if0, if1)
+    if not isinstance(case, tuple): return case
+    node, if0, if1, neg = case
+    if iterative: return build_choice_iteratively(node, if0, if1) ^ neg
+    return build_choice(node, if0, if1) ^ neg
+
+def simplify(node, if0, if1):
+    """Return the edge to node(if0, if1) if it needs no building, else
+    (node, if0, if1, neg) such that it's build_choice(node, if0, if1)^neg."""
+    if node <= 1: return (if0, if1)[node]
+    if if0 == if1: return if0
+    if if0 == 0 and if1 == 1: return node
+    if complement_edges:
+        if if0 == 1 and if1 == 0: return node ^ 1
+        # Normalize, to hit in the computed table more often.
+        if node & 1: node, if0, if1 = node ^ 1, if1, if0
+        if if0 & 1: return node, if0 ^ 1, if1 ^ 1, 1
+    return node, if0, if1, 0
+
+choices = {}                # pack(node, if0, if1) -> edge
+
+def build_choice(node, if0, if1):
+    key = pack(node, if0, if1)
+    try: return choices[key]
+    except KeyError: pass
+    top = min(ranks[node >> 1], ranks[if0 >> 1], ranks[if1 >> 1])
+    n0, n1 = cofactors(top, node)
+    a0, a1 = cofactors(top, if0)
+    b0, b1 = cofactors(top, if1)
+    result = choices[key] = make_node(top, choose(n0, a0, b0),
+                                           choose(n1, a1, b1))
+    return result
+
+# The operations instrument counts and times, by name.
+operations = ('satisfy', 'collect', 'reorder')
+
+def limit_cache(size=None, policy=LossyCache):
+    """Bound the computed table to size entries, evicting per policy (a
+    class from utils), or with size None make it an unbounded dict again.
+    Either way it starts empty."""
+    global choices
+    choices = {} if size is None else policy(size)
+
+def build_choice_iteratively(node, if0, if1):
+    """Like build_choice, sharing its computed table, but keeping the
+    pending cases on an explicit stack, as in article/iterative2.py."""
+    key = pack(node, if0, if1)
+    try: return choices[key]
+    except KeyError: pass
+    # Each frame: the key, the top rank, the pending case's edges and
+    # the complement bit to apply to its result, and the results so far.
+    stack = [(key, top_rank(node, if0, if1), (node, if0, if1), 0, [])]
+    while True:
+        key, top, (node, if0, if1), _, done = stack[-1]
+        if len(done) < 2:
+            c = len(done)
+            case = simplify(cofactors(top, node)[c],
+                            cofactors(top, if0)[c],
+                            cofactors(top, if1)[c])
+            if not isinstance(case, tuple):
+                done.append(case)
+                continue
+            n, a, b, neg = case
+            sub = pack(n, a, b)
+            result = choices.get(sub)
+            if result is not None: done.append(result ^ neg)
+            else:                  stack.append((sub, top_rank(n, a, b), (n, a, b), neg, []))
+        else:
+            _, _, _, neg, _ = stack.pop()
+            result = choices[key] = make_node(top, done[0], done[1])
+            if not stack: return result
+            stack[-1][4].append(result ^ neg)
+
+def top_rank(node, if0, if1):
+    return min(ranks[node >> 1], ranks[if0 >> 1], ranks[if1 >> 1])
+
+def branches(node):
+    "Return the edges out of a choice node, given an edge to it."
+    i, neg = node >> 1, node & 1
+    return if0s[i] ^ neg, if1s[i] ^ neg
+
+def cofactors(rank, node):
+    """Return node's two branches on variable #rank, where rank is no
+    greater than node's own rank."""
+    if ranks[node >> 1] == rank: return branches(node)
+    return node, node
+
+def collect(roots):
+    """Free every node that isn't reachable from roots (a sequence of
+    Nodes) or from any other live Node, for reuse, and drop every
+    computed-table entry that mentions one. (So roots only matter as
+    they do to dd.collect.) Return the number of nodes left."""
+    live = bytearray(len(ranks))
+    live[0] = 1
+    stack = [root.id >> 1 for root in roots] + held()
+    while stack:
+        i = stack.pop()
+        if not live[i]:
+            live[i] = 1
+            stack.append(if0s[i] >> 1)
+            stack.append(if1s[i] >> 1)
+    for key, node in list(unique.items()):
+        if not live[node >> 1]:
+            del unique[key]
+            free.append(node >> 1)
+    for key, result in list(choices.items()):
+        if not (live[result >> 1] and all(live[e >> 1] for e in unpack(key))):
+            del choices[key]
+    collect.size = len(unique)
+    return collect.size
+collect.size = 0
+
+def held():
+    "Return the indices of the nodes that live Nodes refer to."
+    return [i for i, n in enumerate(handles) if n]
+
+permanent = []              # The nodes keep() keeps.
+
+def keep(*nodes):
+    "Make collect always keep nodes, as dd.keep does."
+    permanent.extend(nodes)
+
+def collect_if_grown(roots, factor=2):
+    """Collect (or, with auto_reorder on, reorder) if the unique table
+    has grown by factor since the last collection: cheap enough to call
+    after every step of a big build."""
+    if factor * max(collect.size, 1000) <= len(unique):
+        (reorder if auto_reorder else collect)(roots)
+
+def evaluate(node, env):
+    while 1 < node:
+        node = branches(node)[env[var_of(ranks[node >> 1])]]
+    return node
+
+
+# Variable reordering
+
+levels    = {}              # rank -> level, where they differ
+variables = {}              # level -> rank, where they differ
+
+def level_of(rank): return levels.get(rank, rank)
+def var_of(level):  return variables.get(level, level)
+
+def reorder(roots, max_growth=1.2):
+    """Sift each variable in turn to the level where the diagram is
+    smallest, after Rudell. Nodes are rewritten in place, so every node
+    reachable from roots or from any live Node keeps its edge and
+    meaning, as with collect(). Return the number of nodes left."""
+    collect(roots)
+    choices.clear()
+    refs = array('i', [0]) * len(ranks)
+    at = {}                 # level -> set of indices of the nodes there
+    for node in unique.values():
+        i = node >> 1
+        refs[if0s[i] >> 1] += 1
+        refs[if1s[i] >> 1] += 1
+        at.setdefault(ranks[i], set()).add(i)
+    for i in [root.id >> 1 for root in roots] + held():
+        refs[i] += 1
+    order = sorted(at)
+    by_size = sorted(order, key=lambda level: -len(at[level]))
+    for rank in [var_of(level) for level in by_size]:
+        sift(order.index(level_of(rank)), order, at, refs, max_growth)
+    collect.size = len(unique)
+    return collect.size
+
+def sift(k, order, at, refs, max_growth):
+    "Move the variable at level order[k] to its best level."
+    best_size, best_k = len(unique), k
+    for step in (1, -1):
+        while (0 <= k + step < len(order)
+               and len(unique) <= max_growth * best_size):
+            swap(min(k, k + step), order, at, refs)
+            k += step
+            if len(unique) < best_size:
+                best_size, best_k = len(unique), k
+    while k < best_k:
+        swap(k, order, at, refs)
+        k += 1
+    while best_k < k:
+        swap(k - 1, order, at, refs)
+        k -= 1
+
+def swap(k, order, at, refs):
+    """Exchange the variables at levels x = order[k] and y = order[k+1],
+    rewriting the nodes at x in place."""
+    x, y = order[k], order[k+1]
+    xs, ys = at.pop(x, set()), at.pop(y, set())
+    at[x], at[y] = set(), set()
+    for i in xs | ys:
+        del unique[pack(ranks[i], if0s[i], if1s[i])]
+    def tests_y(e): return (e >> 1) in ys
+    dependent = [i for i in xs if tests_y(if0s[i]) or tests_y(if1s[i])]
+    def rehash(i, level):
+        ranks[i] = level
+        unique[pack(level, if0s[i], if1s[i])] = i << 1
+        at[level].add(i)
+    for i in ys:
+        rehash(i, x)
+    for i in set(xs).difference(dependent):
+        rehash(i, y)
+    def split(e): return branches(e) if tests_y(e) else (e, e)
+    for i in dependent:
+        f0, f1 = if0s[i], if1s[i]
+        (f00, f01), (f10, f11) = split(f0), split(f1)
+        if0s[i] = refer(y, f00, f10, at, refs)
+        if1s[i] = refer(y, f01, f11, at, refs)
+        rehash(i, x)
+        release(f0, at, refs)
+        release(f1, at, refs)
+    a, b = var_of(x), var_of(y)
+    for rank, level in ((a, y), (b, x)):
+        if rank == level: levels.pop(rank, None); variables.pop(level, None)
+        else:             levels[rank] = level; variables[level] = rank
+
+def refer(level, if0, if1, at, refs):
+    "Like make_node, but counting the reference to the result."
+    if if0 == if1:
+        node = if0
+    elif complement_edges and if0 & 1:
+        return refer(level, if0 ^ 1, if1 ^ 1, at, refs) ^ 1
+    else:
+        node = unique.get(pack(level, if0, if1))
+        if node is None:
+            node = build_node(level, if0, if1)
+            i = node >> 1
+            if len(refs) <= i: refs.append(0)
+            at[level].add(i)
+            refs[if0 >> 1] += 1
+            refs[if1 >> 1] += 1
+    refs[node >> 1] += 1
+    return node
+
+def release(node, at, refs):
+    "Drop a reference, freeing the nodes no longer referred to."
+    stack = [node >> 1]
+    while stack:
+        i = stack.pop()
+        refs[i] -= 1
+        if refs[i] == 0 and i != 0:
+            del unique[pack(ranks[i], if0s[i], if1s[i])]
+            at[ranks[i]].discard(i)
+            free.append(i)
+            stack.append(if0s[i] >> 1)
+            stack.append(if1s[i] >> 1)
+
+
+class Node(object):
+    "A handle on a node, given the edge to it."
+    __slots__ = ('id',)
+    def __init__(self, id):
+        self.id = id
+        handles[id >> 1] += 1
+    def __del__(self, handles=handles):
+        handles[self.id >> 1] -= 1
+    def __invert__(self):      return Node(negate(self.id))
+    def __and__(self, other):  return self(lit0, other)
+    def __or__(self, other):   return self(other, lit1)
+    def __xor__(self, other):  return self(other, ~other)
+    def __call__(self, if0, if1):
+        return Node(choose(self.id, if0.id, if1.id))
+    def __eq__(self, other):   return isinstance(other, Node) and self.id == other.id
+    def __ne__(self, other):   return not self == other
+    def __hash__(self):        return hash(self.id)
+    def __repr__(self):        return 'Node(%d)' % self.id
+    def evaluate(self, env):   return evaluate(self.id, env)
+    @property
+    def rank(self):
+        level = ranks[self.id >> 1]
+        return float('Inf') if level == infinite_rank else var_of(level)
+    @property
+    def level(self):
+        "Where the node's variable comes in the order: its rank, until reorder()."
+        level = ranks[self.id >> 1]
+        return float('Inf') if level == infinite_rank else level
+    @property
+    def value(self):
+        return self.id if self.id <= 1 else None
+    @property
+    def if0(self):             return Node(branches(self.id)[0])
+    @property
+    def if1(self):             return Node(branches(self.id)[1])
+    @property
+    def branches(self):
+        return () if self.id <= 1 else tuple(map(Node, branches(self.id)))
+
+def Equiv(p, q):   return p(~q, q)
+def Implies(p, q): return p(lit1, q)
+
+def Constant(value):
+    assert value in (0, 1)
+    return Node(value)
+
+lit0, lit1 = Constant(0), Constant(1)
+
+def Variable(rank, arity=2):
+    assert arity == 2, "Only binary variables here; see dd.py"
+    return Node(make_node(level_of(rank), 0, 1))
+
+def is_valid(node):
+    return satisfy(node, 0) is None
+
+def satisfy(node, goal):
+    """Return the lexicographically first env such that
+    node.evaluate(env) == goal, if there's any; else None.
+    (The env may leave out variables that don't matter.)"""
+    node, env = node.id, {}
+    while 1 < node:
+        if0, if1 = branches(node)
+        rank = var_of(ranks[node >> 1])
+        if 1 < if0 or if0 == goal: env[rank], node = 0, if0
+        else:                      env[rank], node = 1, if1
+    return env if node == goal else None
+
+
+## x, y = map(Variable, (8, 9))
+## is_valid(lit0), is_valid(lit1), is_valid(x)
+#. (False, True, False)
+## satisfy(x&~y, 1)
+#. {8: 1, 9: 0}
+## is_valid(Implies(Implies(Implies(x, y), x), x))
+#. True
+## is_valid(Equiv(x ^ y, ~Equiv(x, y)))
+#. True
@@ -26,6 +26,12 @@ def queens(n):
     else:
         show_board(n, env)
 
+def all_queens(n):
+    "Show every solution, without holding them all in memory."
+    for env in dd.solutions(queens_problem(n), range(1, 1+n*n)):
+        show_board(n, env)
+        print('')
+
 def show_board(n, env):
     for row in make_board(n):
         for var in row:
@@ -4,6 +4,7 @@ TODO: try the tableau method too
 """
 
 import bddsat
+import dd
 import dimacs
 import sat
 
@@ -18,10 +19,11 @@ def main():
     for filename in filenames:
         print(filename)
         _, problem = dimacs.load(filename)
-        solution = bddsat.solve(problem)
+        solution = bddsat.solve(problem, roots=[])
         print(solution)
         if solution is not None:
             assert sat.is_satisfied(problem, solution)
+        dd.collect([])
         print
 
 ## main()
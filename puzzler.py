@@ -58,6 +58,13 @@ def solve(puzzle_text):
     else:
         show(dd.satisfy(condition, 1))
 
+def solve_all(puzzle_text):
+    "Show every solution, as a cube leaving out the variables that don't matter."
+    condition, = parse(puzzle_text)
+    for env in dd.cubes(condition, 1):
+        show(env)
+        print('')
+
 def show(opt_env):
     if opt_env is None:
         print("Unsatisfiable.")
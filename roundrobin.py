@@ -0,0 +1,57 @@
+"""
+The round-robin scheduling model of article/iterative.py, on dd.py:
+over some days, every pair of teams must meet exactly once, and each
+team does exactly one thing a day, either one match or a bye.
+"""
+
+from dd import Variable, lit0, lit1
+
+def make_variables(teams, days):
+    """Return a dict from (team, other, day) to a variable for that match
+    on that day, where other is None for a bye. Ranks follow the
+    article's order: by day, then team, with each team's bye last."""
+    variables = {}
+    for day in range(days):
+        for t in range(teams):
+            for u in range(t+1, teams):
+                variables[t, u, day] = Variable(len(variables))
+            variables[t, None, day] = Variable(len(variables))
+    return variables
+
+def make_constraints(teams, days, variables):
+    "Return the list of exactly-one constraints, in the article's order."
+    constraints = []
+    for t in range(teams):
+        for day in range(days):
+            constraints.append(exactly_one([v for (i, j, d), v in variables.items()
+                                            if d == day and t in (i, j)]))
+        for u in range(t+1, teams):
+            constraints.append(exactly_one([v for (i, j, d), v in variables.items()
+                                            if (i, j) == (t, u)]))
+    return constraints
+
+def exactly_one(nodes):
+    "Return the constraint that exactly one of the variables in nodes is true."
+    none, one = lit1, lit0
+    for v in sorted(nodes, key=lambda v: v.rank, reverse=True):
+        none, one = v(none, lit0), v(one, none)
+    return one
+
+def conjoin_pairwise(nodes):
+    """Return the conjunction of nodes, merging neighbors in a balanced
+    tree, as make_constraint_graph_binary does."""
+    nodes = list(nodes) or [lit1]
+    while len(nodes) > 1:
+        merged = [nodes[i] & nodes[i+1] for i in range(0, len(nodes) - 1, 2)]
+        if len(nodes) % 2: merged.append(nodes[-1])
+        nodes = merged
+    return nodes[0]
+
+def schedule(teams, days):
+    "Return the constraint graph for teams playing over days."
+    variables = make_variables(teams, days)
+    return conjoin_pairwise(make_constraints(teams, days, variables))
+
+## import dd
+## dd.count(schedule(4, 3), range(30))
+#. 6
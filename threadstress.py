@@ -0,0 +1,82 @@
+"""
+Build overlapping formulas on dd.py from many threads at once, and check
+that they all end up sharing one canonical set of nodes; or, with each
+thread in a Manager of its own, that they keep out of each other's.
+
+    python threadstress.py [threads] [rounds]
+"""
+
+import random, sys, threading
+import dd, ddfile, roundrobin
+
+def formulas(seed):
+    "Build some constraints that other threads build too, in a random order."
+    rng = random.Random(seed)
+    variables = roundrobin.make_variables(4, 3)
+    constraints = roundrobin.make_constraints(4, 3, variables)
+    rng.shuffle(constraints)
+    result = dd.lit1
+    for c in constraints: result = result & c
+    parity = dd.lit0
+    for rank in rng.sample(range(20), 20): parity = parity ^ dd.Variable(rank)
+    return result, parity
+
+def stress(threads=8, rounds=5):
+    """Run formulas() on threads threads, rounds times over, switching
+    threads as often as the interpreter allows; raise AssertionError if
+    they disagree or the unique table holds two copies of a node."""
+    interval = getattr(sys, 'getswitchinterval', lambda: None)()
+    if interval is not None: sys.setswitchinterval(1e-6)
+    else: sys.setcheckinterval(1)
+    try:
+        for r in range(rounds):
+            dd.collect([])
+            results = [None] * threads
+            def work(i):
+                results[i] = formulas(1000*r + i)
+            workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+            for w in workers: w.start()
+            for w in workers: w.join()
+            assert all(result == results[0] for result in results), 'threads disagree'
+            check_canonical()
+    finally:
+        if interval is not None: sys.setswitchinterval(interval)
+        else: sys.setcheckinterval(100)
+    return 'passed'
+
+def stress_managers(threads=8, rounds=5):
+    """Like stress, but with each thread building in a Manager of its
+    own; raise AssertionError if any thread's nodes or tables hold
+    another's, or their results differ in shape."""
+    def work(i, r):
+        with dd.Manager() as m:
+            result = formulas(1000*r + i)
+            check_canonical()
+            universes = set(e.universe for e in dd.postorder(list(result)))
+            assert universes <= set([None, m.universe]), 'nodes from another manager'
+            results[i] = ddfile.dumps(list(result))
+    interval = getattr(sys, 'getswitchinterval', lambda: None)()
+    if interval is not None: sys.setswitchinterval(1e-6)
+    else: sys.setcheckinterval(1)
+    try:
+        for r in range(rounds):
+            results = [None] * threads
+            workers = [threading.Thread(target=work, args=(i, r)) for i in range(threads)]
+            for w in workers: w.start()
+            for w in workers: w.join()
+            assert all(result == results[0] for result in results), 'threads disagree'
+    finally:
+        if interval is not None: sys.setswitchinterval(interval)
+        else: sys.setcheckinterval(100)
+    return 'passed'
+
+def check_canonical():
+    "Assert every node's branches are the nodes the unique table holds."
+    table = dd.table(dd.build_node)
+    interned = set(table.values())
+    for node in dd.postorder(list(interned)):
+        assert node.value is not None or node in interned, 'a node escaped the table'
+
+if __name__ == '__main__':
+    print(stress(*map(int, sys.argv[1:])))
+    print(stress_managers(*map(int, sys.argv[1:])))
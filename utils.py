@@ -1,3 +1,6 @@
+from collections import OrderedDict
+import threading
+
 def memoize(f):
     """Return a function like f but caching its results. Its arguments
     must be hashable."""
@@ -8,3 +11,152 @@ def memoize(f):
             return result
     memoized._memos = {}
     return memoized
+
+def memoize_safely(f, stripes=64):
+    """Like memoize, but for tables like the unique table, where two
+    results for one key would break identity, and threads may call at
+    once: a miss takes one of stripes locks, picked by the key's hash,
+    and looks again before calling f. Hits take no lock. f mustn't call
+    back into the memoized function."""
+    locks = [threading.Lock() for _ in range(stripes)]
+    def memoized(*args):
+        try: return memoized._memos[args]
+        except KeyError: pass
+        with locks[hash(args) % stripes]:
+            memos = memoized._memos
+            try: return memos[args]
+            except KeyError:
+                result = memos[args] = f(*args)
+                return result
+    memoized._memos = {}
+    return memoized
+
+def stepwise(cases, join):
+    """Return a memoized function of a key's parts, whose work splits
+    into cases: cases(key, done) generates each, either a finished
+    result or the key (a tuple; results mustn't be) of a case to work
+    out in turn, and can see their results so far in done, to stop
+    early; join(key, done) makes the result. The function itself recurs
+    on the cases; build_iteratively needn't."""
+    @memoize
+    def build(*key):
+        done = []
+        for case in cases(key, done):
+            done.append(build(*case) if isinstance(case, tuple) else case)
+        return join(key, done)
+    build.cases, build.join = cases, join
+    return build
+
+def build_iteratively(f, key, memos=None):
+    """Like f(*key) for f made by stepwise, sharing its memo table (or
+    memos, if given), but keeping the pending cases on an explicit stack,
+    so deep diagrams can't overflow Python's."""
+    if memos is None: memos = f._memos
+    try: return memos[key]
+    except KeyError: pass
+    done = []
+    stack = [(key, f.cases(key, done), done)]
+    while True:
+        key, pending, done = stack[-1]
+        case = next(pending, None)
+        if case is None:
+            stack.pop()
+            result = memos[key] = f.join(key, done)
+            if not stack: return result
+            stack[-1][2].append(result)
+        elif not isinstance(case, tuple):
+            done.append(case)
+        else:
+            result = memos.get(case)
+            if result is not None:
+                done.append(result)
+            else:
+                subdone = []
+                stack.append((case, f.cases(case, subdone), subdone))
+
+class BoundedCache(object):
+    """A stand-in for a memo dict of at most `size` entries, for tables
+    like build_choice's that only save work: it may forget what it's
+    told. Counts hits, misses and evictions."""
+    def __init__(self, size):
+        assert 0 < size
+        self.size = size
+        self.hits = self.misses = self.evictions = 0
+        self.clear()
+    def get(self, key, default=None):
+        try: return self[key]
+        except KeyError: return default
+    def stats(self):
+        return dict(size=self.size, entries=len(self), hits=self.hits,
+                    misses=self.misses, evictions=self.evictions)
+
+class LossyCache(BoundedCache):
+    """A hash table where a new entry overwrites any other in its slot.
+    Each slot holds a (key, value) pair, so threads that race to fill a
+    slot can't leave one's key with another's value."""
+    def clear(self):
+        self.entries = [None] * self.size
+    def slot(self, key):
+        # (Scramble the hash, since ints and ids hash to themselves.)
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h = ((h ^ (h >> 33)) * 0xFF51AFD7ED558CCD) & 0xFFFFFFFFFFFFFFFF
+        i = (h ^ (h >> 33)) % self.size
+        entry = self.entries[i]
+        return i, entry if entry is not None and entry[0] == key else None
+    def __getitem__(self, key):
+        i, entry = self.slot(key)
+        if entry is None:
+            self.misses += 1
+            raise KeyError(key)
+        self.hits += 1
+        return entry[1]
+    def __contains__(self, key):
+        return self.slot(key)[1] is not None
+    def __setitem__(self, key, value):
+        i, entry = self.slot(key)
+        if entry is None and self.entries[i] is not None:
+            self.evictions += 1
+        self.entries[i] = (key, value)
+    def __delitem__(self, key):
+        i, entry = self.slot(key)
+        if entry is None: raise KeyError(key)
+        self.entries[i] = None
+    def __len__(self):
+        return sum(1 for entry in self.entries if entry is not None)
+    def items(self):
+        return [entry for entry in self.entries if entry is not None]
+
+class LRUCache(BoundedCache):
+    "Evicts the least-recently-used entry."
+    def clear(self):
+        self.entries = OrderedDict()
+    def __getitem__(self, key):
+        try: value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        self.entries[key] = value
+        return value
+    def __contains__(self, key):
+        return key in self.entries
+    def __setitem__(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        if self.size < len(self.entries):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    def __delitem__(self, key):
+        del self.entries[key]
+    def __len__(self):
+        return len(self.entries)
+    def items(self):
+        return list(self.entries.items())
+
+def limit_caches(functions, size=None, policy=LossyCache):
+    """Bound the memo tables of functions, tables that only save work, to
+    size entries each, evicting per policy (LossyCache or LRUCache), or
+    with size None make them unbounded dicts again. Either way they start
+    empty."""
+    for f in functions:
+        f._memos = {} if size is None else policy(size)
@@ -0,0 +1,256 @@
+"""
+Zero-suppressed decision diagrams (Minato's ZDDs): a node stands for a
+family of sets of variables (named by rank), and a variable absent from
+a path means it's absent from the sets, instead of don't-care as in a
+BDD. So sparse families, like the placements of a few queens on a big
+board, take few nodes.
+
+A node tests its rank: if0 is the family of the sets without it, if1
+that of the sets with it (taken out). A node whose if1 is empty is
+left out, the way a BDD leaves out a node whose branches are alike.
+"""
+
+from utils import memoize_safely, stepwise, build_iteratively, limit_caches, LossyCache
+import dd
+
+class Node(object):
+    "A family of sets."
+    __or__  = lambda self, other: union(self, other)
+    __and__ = lambda self, other: intersection(self, other)
+    __sub__ = lambda self, other: difference(self, other)
+    __xor__ = lambda self, other: union(difference(self, other),
+                                        difference(other, self))
+
+class ConstantNode(Node):
+    rank = float('Inf')   # Greater than any variable's rank.
+    branches = ()
+    def __init__(self, value): self.value = value
+
+Constant = memoize_safely(ConstantNode)
+empty, base = Constant(0), Constant(1)   # The family {}, and {{}}.
+
+class ChoiceNode(Node):
+    value = None
+    def __init__(self, rank, if0, if1):
+        assert rank < if0.rank and rank < if1.rank
+        self.rank = rank
+        self.if0 = if0
+        self.if1 = if1
+    branches = property(lambda self: (self.if0, self.if1))
+
+build_node = memoize_safely(ChoiceNode)
+
+def make_node(rank, if0, if1):
+    if if1 is empty: return if0
+    return build_node(rank, if0, if1)
+
+def single(rank):
+    "Return the family {{rank}}."
+    return make_node(rank, empty, base)
+
+def family(sets):
+    "Return the family of the given sets of ranks."
+    result = empty
+    for s in sets:
+        node = base
+        for rank in sorted(set(s), reverse=True):
+            node = make_node(rank, empty, node)
+        result = union(result, node)
+    return result
+
+def members(node):
+    "Generate the sets in node's family, as sorted tuples of ranks."
+    stack = [(node, ())]
+    while stack:
+        node, chosen = stack.pop()
+        if node is base: yield chosen
+        elif node is not empty:
+            stack.append((node.if1, chosen + (node.rank,)))
+            stack.append((node.if0, chosen))
+
+def run(f, case):
+    "Return case if it's a result, else f(*case) for f made by stepwise."
+    return build_iteratively(f, case) if isinstance(case, tuple) else case
+
+# Each operation below is a stepwise function, given by its key (which
+# returns the result instead when there's nothing to build), cases and
+# join, so that it builds without recursion.
+
+def union(p, q): return run(build_union, union_key(p, q))
+
+def union_key(p, q):
+    if p is empty or p is q: return q
+    if q is empty:           return p
+    return (p, q) if p.rank <= q.rank else (q, p)
+
+def union_cases(key, done):
+    p, q = key
+    if p.rank < q.rank: yield union_key(p.if0, q)
+    else:               yield union_key(p.if0, q.if0); yield union_key(p.if1, q.if1)
+
+def union_join(key, done):
+    p, q = key
+    return make_node(p.rank, done[0], p.if1 if p.rank < q.rank else done[1])
+
+build_union = stepwise(union_cases, union_join)
+
+def intersection(p, q): return run(build_intersection, intersection_key(p, q))
+
+def intersection_key(p, q):
+    while True:
+        if p is empty or q is empty: return empty
+        if p is q:                   return p
+        if p.rank > q.rank:          p, q = q, p
+        if p.rank == q.rank:         return (p, q)
+        p = p.if0
+
+def intersection_cases(key, done):
+    p, q = key
+    yield intersection_key(p.if0, q.if0)
+    yield intersection_key(p.if1, q.if1)
+
+def intersection_join(key, done):
+    return make_node(key[0].rank, *done)
+
+build_intersection = stepwise(intersection_cases, intersection_join)
+
+def difference(p, q): return run(build_difference, difference_key(p, q))
+
+def difference_key(p, q):
+    while True:
+        if p is empty or p is q: return empty
+        if q is empty:           return p
+        if p.rank <= q.rank:     return (p, q)
+        q = q.if0
+
+def difference_cases(key, done):
+    p, q = key
+    if p.rank < q.rank: yield difference_key(p.if0, q)
+    else:               yield difference_key(p.if0, q.if0); yield difference_key(p.if1, q.if1)
+
+def difference_join(key, done):
+    p, q = key
+    return make_node(p.rank, done[0], p.if1 if p.rank < q.rank else done[1])
+
+build_difference = stepwise(difference_cases, difference_join)
+
+def change(node, rank):
+    "Return node's family with rank toggled in (or out of) every set."
+    return run(build_change, change_key(node, rank))
+
+def change_key(node, rank):
+    if rank < node.rank:  return make_node(rank, empty, node)
+    if rank == node.rank: return make_node(rank, node.if1, node.if0)
+    return (node, rank)
+
+def onset(node, rank):
+    "Return the sets in node's family that hold rank, with rank taken out."
+    return run(build_onset, onset_key(node, rank))
+
+def onset_key(node, rank):
+    if rank < node.rank:  return empty
+    if rank == node.rank: return node.if1
+    return (node, rank)
+
+def offset(node, rank):
+    "Return the sets in node's family that lack rank."
+    return run(build_offset, offset_key(node, rank))
+
+def offset_key(node, rank):
+    if rank < node.rank:  return node
+    if rank == node.rank: return node.if0
+    return (node, rank)
+
+def branchwise(node_key):
+    "Return the cases for an operation on each branch of a node and a rank."
+    def cases(key, done):
+        node, rank = key
+        yield node_key(node.if0, rank)
+        yield node_key(node.if1, rank)
+    return cases
+
+def rebuild(key, done):
+    return make_node(key[0].rank, *done)
+
+build_change = stepwise(branchwise(change_key), rebuild)
+build_onset  = stepwise(branchwise(onset_key), rebuild)
+build_offset = stepwise(branchwise(offset_key), rebuild)
+
+def count(node):
+    "Return the number of sets in node's family."
+    return run(build_count, count_key(node))
+
+def count_key(node):
+    return node.value if node.value is not None else (node,)
+
+def count_cases(key, done):
+    node, = key
+    yield count_key(node.if0)
+    yield count_key(node.if1)
+
+build_count = stepwise(count_cases, lambda key, done: sum(done))
+
+def from_bdd(node, ranks):
+    """Return the family of the sets of variables, among ranks, that make
+    node (from dd.py, bdd.py or intbdd.py) true; ranks must include all
+    the variables node tests, in order of rank (so not after intbdd's
+    reorder() has moved them)."""
+    ranks = sorted(ranks)
+    key = dd.ordering(dd.postorder([node]))
+    if sorted(ranks, key=key) != ranks:
+        raise ValueError("node doesn't test its variables in order of rank")
+    def convert_key(node, i):
+        if i < len(ranks): return (node, i)
+        assert node.value is not None, "node tests a variable not in ranks"
+        return base if node.value else empty
+    def cases(key, done):
+        node, i = key
+        if ranks[i] < node.rank: if0 = if1 = node
+        else:                    if0, if1 = node.branches
+        yield convert_key(if0, i+1)
+        yield convert_key(if1, i+1)
+    def join(key, done):
+        return make_node(ranks[key[1]], *done)
+    return run(stepwise(cases, join), convert_key(node, 0))
+
+def to_bdd(node, ranks, module=dd):
+    """Return the BDD, in module, that's true of just the sets in node's
+    family, as assignments to the variables of ranks."""
+    ranks = sorted(ranks)
+    def convert_key(node, i):
+        if i < len(ranks): return (node, i)
+        return module.Constant(1 if node is base else 0)
+    def cases(key, done):
+        node, i = key
+        if ranks[i] < node.rank: if0, if1 = node, empty
+        else:                    if0, if1 = node.if0, node.if1
+        yield convert_key(if0, i+1)
+        yield convert_key(if1, i+1)
+    def join(key, done):
+        return module.Variable(ranks[key[1]])(*done)
+    return run(stepwise(cases, join), convert_key(node, 0))
+
+def size(node):
+    "Return the number of choice nodes in node's diagram."
+    return sum(1 for e in dd.postorder([node]) if e.value is None)
+
+# The operations' tables, which only save work, for limit_cache.
+computed = (build_union, build_intersection, build_difference, build_change,
+            build_onset, build_offset, build_count)
+
+# The operations instrument counts and times, by name.
+operations = ('union', 'intersection', 'difference', 'change', 'onset',
+              'offset', 'count', 'from_bdd', 'to_bdd')
+
+def limit_cache(size=None, policy=LossyCache):
+    "Bound the operations' tables, as utils.limit_caches does."
+    limit_caches(computed, size, policy)
+
+## f = family([{1, 2}, {2}, {3}])
+## count(f), sorted(members(f | family([{4}]))), sorted(members(onset(f, 2)))
+#. (3, [(1, 2), (2,), (3,), (4,)], [(), (1,)])
+## sorted(members(change(f, 1) - family([(2,)])))
+#. [(1, 2), (1, 3)]
+## b = to_bdd(f, [1, 2, 3])
+## dd.count(b, [1, 2, 3]), from_bdd(b, [1, 2, 3]) is f
+#. (3, True)